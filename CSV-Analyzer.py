@@ -1,10 +1,24 @@
 import io
 import re
+import time
 import numpy as np
 import pandas as pd
+import pyarrow.dataset as ds
 import streamlit as st
 import plotly.express as px
-import plotly.graph_objects as go
+from csv_explorer import (
+    ADMIN_TOKEN, CHART_POINT_BUDGET, CORR_HEATMAP_MAX_COLUMNS, CORR_SAMPLE_ROWS, CORR_TOP_PAIRS,
+    DENSITY_BINS, PIE_MAX_SLICES, UPLOAD_TYPES, arrow_search_mask, bar_totals, box_figure,
+    box_statistics, build_trigram_index, category_options, compact_dtypes,
+    convert_csv_to_parquet, convert_datetime_columns, converted_row_fingerprints,
+    correlation_matrix, correlation_pairs, CsvSource, dataset_registry, density_figure,
+    detect_datetime_columns, histogram_bins, histogram_figure, hll_precision, is_text_dtype,
+    lttb_rows, narrow_rows, narrows_search, out_of_core_path, parse_cache_path, profile_columns,
+    read_csv_fast, read_parse_cache, refine_search_mask, render_out_of_core_view, row_count,
+    row_fingerprints, row_selection_key, safe_numeric_df, scan_search_mask, session_token,
+    show_figure, stratified_sample_rows, take_rows, top_k_values, upload_sources,
+    write_parse_cache,
+)
 
 st.set_page_config(
     page_title="CSV Explorer",
@@ -18,44 +32,34 @@ st.caption("Upload a CSV file, search it, inspect full rows, analyze columns, an
 # -----------------------------
 # Helpers
 # -----------------------------
-@st.cache_data
-def load_csv(uploaded_file, encoding):
-    return pd.read_csv(uploaded_file, encoding=encoding)
-
-def build_search_series(df: pd.DataFrame) -> pd.Series:
-    return df.astype(str).fillna("").agg(" | ".join, axis=1)
-
-def detect_datetime_columns(df: pd.DataFrame):
-    datetime_cols = []
-    for col in df.columns:
-        sample = df[col].dropna()
-        if sample.empty:
-            continue
-        converted = pd.to_datetime(sample.head(200), errors="coerce", utc=True)
-        if converted.notna().mean() > 0.6:
-            datetime_cols.append(col)
-    return datetime_cols
-
-def convert_datetime_columns(df: pd.DataFrame, cols):
-    out = df.copy()
-    for col in cols:
-        out[col] = pd.to_datetime(out[col], errors="coerce", utc=True)
-    return out
-
-def safe_numeric_df(df: pd.DataFrame):
-    numeric_cols = df.select_dtypes(include=np.number).columns.tolist()
-    return df[numeric_cols], numeric_cols
+def load_csv(source: CsvSource, fingerprint: str, encoding):
+    cache_path = parse_cache_path(fingerprint, encoding=encoding)
+    start = time.perf_counter()
+    df, meta = read_parse_cache(cache_path)
+    if df is not None:
+        seconds = max(time.perf_counter() - start, 1e-9)
+        size_mb = source.size / 1_000_000
+        return df, {
+            "engine": "parse cache",
+            "size_mb": round(size_mb, 2),
+            "seconds": round(seconds, 3),
+            "mb_per_s": round(size_mb / seconds, 1),
+        }
+    df, parse_stats = read_csv_fast(source, encoding=encoding)
+    write_parse_cache(cache_path, df, {"parse_stats": parse_stats})
+    return df, parse_stats
 
 def text_column_candidates(df: pd.DataFrame):
     candidates = []
     for col in df.columns:
-        if df[col].dtype == "object":
+        if is_text_dtype(df[col]):
             candidates.append(col)
     return candidates
 
 def keyword_frequency(df: pd.DataFrame, text_col: str, top_n: int = 20):
     text = (
         df[text_col]
+        .astype(object)
         .fillna("")
         .astype(str)
         .str.lower()
@@ -77,8 +81,47 @@ def keyword_frequency(df: pd.DataFrame, text_col: str, top_n: int = 20):
 # Sidebar
 # -----------------------------
 st.sidebar.header("Upload")
-uploaded_file = st.sidebar.file_uploader("Upload CSV file", type=["csv"])
+uploaded_file = st.sidebar.file_uploader(
+    "Upload CSV file",
+    type=UPLOAD_TYPES,
+    help="Also accepts .csv.gz, .csv.bz2 and .csv.zst files, and .zip archives of CSV files."
+)
 encoding = st.sidebar.selectbox("Encoding", ["utf-8", "utf-8-sig", "cp1256", "latin1"], index=1)
+out_of_core_mb = st.sidebar.number_input(
+    "Out-of-core mode above (MB)",
+    min_value=1,
+    value=1024,
+    step=256,
+    help="Larger files are converted to Parquet on disk and queried there instead of being loaded into memory."
+)
+compact_types = st.sidebar.checkbox(
+    "Compact column types after load",
+    value=False,
+    help="Store low-cardinality text as categories, other text as Arrow strings, and downcast numbers where values allow."
+)
+
+approx_distinct_above = st.sidebar.number_input(
+    "Approximate distinct counts above (rows)",
+    min_value=0,
+    value=1_000_000,
+    step=100_000,
+    help="Columns with more rows than this get HyperLogLog distinct estimates instead of exact counts."
+)
+distinct_error_pct = st.sidebar.number_input(
+    "Distinct estimate error (%)",
+    min_value=0.5,
+    max_value=25.0,
+    value=1.0,
+    step=0.5
+)
+distinct_precision = hll_precision(distinct_error_pct / 100)
+
+registry = dataset_registry()
+if ADMIN_TOKEN and st.query_params.get("admin") == ADMIN_TOKEN:
+    with st.sidebar.expander("Resident datasets", expanded=False):
+        resident = registry.summary()
+        st.caption(f"{len(resident)} dataset(s), {resident['memory_mb'].sum():,.1f} MB shared across sessions")
+        st.dataframe(resident, use_container_width=True)
 
 if uploaded_file is None:
     st.info("Upload a CSV file from the sidebar to begin.")
@@ -88,23 +131,92 @@ if uploaded_file is None:
 # Load data
 # -----------------------------
 try:
-    df = load_csv(uploaded_file, encoding)
+    sources = upload_sources(uploaded_file)
 except Exception as e:
     st.error(f"Could not read the file: {e}")
     st.stop()
+if not sources:
+    st.error("The uploaded archive contains no CSV files.")
+    st.stop()
+source = sources[0]
+if len(sources) > 1:
+    source = st.sidebar.selectbox("CSV file in archive", sources, format_func=lambda source: source.member)
+
+if source.size > out_of_core_mb * 1_000_000:
+    try:
+        with st.spinner("Converting to Parquet for out-of-core mode..."):
+            parquet_path = convert_csv_to_parquet(
+                source,
+                out_of_core_path(source.fingerprint, encoding=encoding),
+                encoding
+            )
+        dataset = ds.dataset(parquet_path, format="parquet")
+    except Exception as e:
+        st.error(f"Could not read the file: {e}")
+        st.stop()
+    render_out_of_core_view(dataset, dataset.schema.names)
+    st.stop()
 
-original_df = df.copy()
+# The parsed frame and its row hashes live in the shared registry; this
+# session only keeps its own selections and widget state.
+dataset_key = f"{source.fingerprint}:{encoding}"
+dataset = registry.acquire(f"{dataset_key}:{compact_types}", session_token())
+if dataset is None:
+    try:
+        df, parse_stats = load_csv(source, source.fingerprint, encoding)
+    except Exception as e:
+        st.error(f"Could not read the file: {e}")
+        st.stop()
+    memory_report = None
+    if compact_types:
+        with st.spinner("Compacting column types..."):
+            df, memory_report = compact_dtypes(df)
+    with st.spinner("Fingerprinting rows..."):
+        row_hashes = row_fingerprints(df)
+    dataset = registry.put(
+        f"{dataset_key}:{compact_types}", df,
+        name=source.name, parse_stats=parse_stats, memory_report=memory_report, row_hashes=row_hashes
+    )
+df = dataset["df"]
+parse_stats = dataset["parse_stats"]
+memory_report = dataset["memory_report"]
+row_hashes = dataset["row_hashes"]
+
+compressed_note = ""
+if source.compressed_size is not None:
+    compressed_note = f" (uploaded as {source.compressed_size / 1_000_000:,.2f} MB compressed)"
+st.caption(
+    f"Loaded {'about ' if source.size_estimated else ''}{parse_stats['size_mb']:,} MB{compressed_note} "
+    f"in {parse_stats['seconds']}s ({parse_stats['mb_per_s']:,} MB/s via {parse_stats['engine']})"
+)
 
 # Optional datetime conversion
-datetime_candidates = detect_datetime_columns(df)
-if datetime_candidates:
+selected_dt_cols = []
+datetime_formats = detect_datetime_columns(df, f"{dataset_key}:{compact_types}")
+if datetime_formats:
     selected_dt_cols = st.sidebar.multiselect(
         "Datetime columns to parse",
-        options=datetime_candidates,
-        default=[]
+        options=list(datetime_formats),
+        default=[],
+        format_func=lambda col: f"{col} ({datetime_formats[col] or 'mixed formats'})"
     )
+    mixed_dt_cols = [col for col in selected_dt_cols if datetime_formats[col] is None]
+    if mixed_dt_cols:
+        st.warning(
+            f"No single date format fits {', '.join(mixed_dt_cols)}; "
+            "these columns are parsed value by value, which is much slower."
+        )
     if selected_dt_cols:
-        df = convert_datetime_columns(df, selected_dt_cols)
+        df, unparsed_dates = convert_datetime_columns(
+            df, {col: datetime_formats[col] for col in selected_dt_cols}, f"{dataset_key}:{compact_types}"
+        )
+        for col, count in unparsed_dates.items():
+            if count:
+                st.caption(f"{count:,} values in {col} did not match {datetime_formats[col] or 'any date format'} and are empty")
+
+search_key = "|".join([dataset_key, str(compact_types)] + selected_dt_cols)
+if selected_dt_cols:
+    row_hashes = converted_row_fingerprints(df, search_key)
 
 # -----------------------------
 # Overview
@@ -114,18 +226,29 @@ st.subheader("Dataset overview")
 c1, c2, c3, c4 = st.columns(4)
 c1.metric("Rows", f"{df.shape[0]:,}")
 c2.metric("Columns", f"{df.shape[1]:,}")
-c3.metric("Missing cells", f"{int(df.isna().sum().sum()):,}")
-dup_count = int(df.duplicated().sum())
+overview_profile = profile_columns(
+    df, f"{search_key}:{row_selection_key(None)}", approx_distinct_above, distinct_precision
+)
+c3.metric("Missing cells", f"{int(overview_profile['missing_count'].sum()):,}")
+dup_count = int(row_hashes["all_columns"].duplicated().sum())
 c4.metric("Duplicate rows", f"{dup_count:,}")
 
 with st.expander("Column information", expanded=False):
-    info_df = pd.DataFrame({
-        "column": df.columns,
-        "dtype": [str(df[c].dtype) for c in df.columns],
-        "missing_count": [int(df[c].isna().sum()) for c in df.columns],
-        "missing_pct": [round(df[c].isna().mean() * 100, 2) for c in df.columns],
-        "unique_values": [int(df[c].nunique(dropna=True)) for c in df.columns],
-    })
+    info_df = overview_profile[
+        ["column", "dtype", "missing_count", "missing_pct", "unique_values", "unique_estimated"]
+    ].copy()
+    if info_df["unique_estimated"].any():
+        st.caption(
+            f"unique_values marked as estimated use HyperLogLog "
+            f"(about {distinct_error_pct:g}% standard error)"
+        )
+    if memory_report is not None:
+        info_df["memory_mb_before"] = info_df["column"].map(memory_report["memory_mb_before"])
+        info_df["memory_mb_after"] = info_df["column"].map(memory_report["memory_mb_after"])
+        st.caption(
+            f"Memory: {memory_report['memory_mb_before'].sum():,.1f} MB before compaction, "
+            f"{memory_report['memory_mb_after'].sum():,.1f} MB after"
+        )
     st.dataframe(info_df, use_container_width=True)
 
 # -----------------------------
@@ -144,34 +267,63 @@ st.subheader("Search")
 search_text = st.text_input("Search across all columns")
 case_sensitive = st.checkbox("Case sensitive", value=False)
 use_regex = st.checkbox("Use regex", value=False)
+search_engine = st.radio(
+    "Search engine",
+    ["Trigram index", "Column-wise (Arrow)", "Full scan"],
+    horizontal=True,
+    help="The trigram index is built once per dataset and shared across sessions. "
+         "Column-wise search matches each cell with Arrow kernels. Queries an engine cannot answer "
+         "exactly, such as a regex with . or anchors that could span cells, fall back to a full scan."
+)
 
-filtered_df = df.copy()
+search_rows = None
 
 if search_text.strip():
-    search_series = build_search_series(df)
-
-    if use_regex:
-        try:
-            flags = 0 if case_sensitive else re.IGNORECASE
-            mask = search_series.str.contains(search_text, regex=True, na=False, flags=flags)
-        except re.error as e:
-            st.error(f"Invalid regex: {e}")
-            st.stop()
-    else:
-        needle = search_text if case_sensitive else search_text.lower()
-        haystack = search_series if case_sensitive else search_series.str.lower()
-        mask = haystack.str.contains(re.escape(needle), regex=True, na=False)
-
-    filtered_df = df[mask].copy()
+    search_scope = "|".join([search_key, search_engine])
+    previous = st.session_state.get("last_search")
+    try:
+        if (
+            previous is not None and previous["scope"] == search_scope
+            and narrows_search(previous, search_text, case_sensitive, use_regex)
+        ):
+            mask = refine_search_mask(df, previous["rows"], search_text, case_sensitive, use_regex, search_engine)
+            st.caption(f"Refined within the previous {len(previous['rows']):,} matches")
+        else:
+            result = None
+            if search_engine == "Trigram index":
+                index = build_trigram_index(df, search_key)
+                result = index.search(df, search_text, case_sensitive, use_regex)
+                if result is not None:
+                    mask, verified = result
+                    st.caption(f"Answered from the trigram index ({verified:,} candidates verified)")
+            elif search_engine == "Column-wise (Arrow)":
+                result = arrow_search_mask(df, search_text, case_sensitive, use_regex)
+                if result is not None:
+                    mask, scanned = result
+                    st.caption(f"Matched column by column ({scanned} of {len(df.columns)} columns scanned)")
+            if result is None:
+                mask = scan_search_mask(df, search_text, case_sensitive, use_regex)
+    except re.error as e:
+        st.error(f"Invalid regex: {e}")
+        st.stop()
+
+    st.session_state["last_search"] = {
+        "scope": search_scope,
+        "text": search_text,
+        "case_sensitive": case_sensitive,
+        "use_regex": use_regex,
+        "rows": np.flatnonzero(mask),
+    }
+    search_rows = st.session_state["last_search"]["rows"]
 
-st.write(f"Matching rows: **{len(filtered_df):,}**")
-st.dataframe(filtered_df.head(200), use_container_width=True)
+st.write(f"Matching rows: **{row_count(df, search_rows):,}**")
+st.dataframe(take_rows(df, search_rows, limit=200), use_container_width=True)
 
-if not filtered_df.empty:
+if row_count(df, search_rows):
     st.markdown("### Full row viewer")
-    row_index_options = filtered_df.index.tolist()
+    row_index_options = (df.index if search_rows is None else df.index[search_rows]).tolist()
     selected_row_idx = st.selectbox("Choose a row index", row_index_options)
-    selected_row = filtered_df.loc[selected_row_idx]
+    selected_row = df.loc[selected_row_idx]
 
     row_display = pd.DataFrame({
         "column": selected_row.index,
@@ -190,58 +342,67 @@ st.subheader("Filters")
 
 filter_mode = st.radio("Choose filter mode", ["None", "Categorical", "Numeric range"], horizontal=True)
 
-working_df = filtered_df.copy()
+working_rows = search_rows
 
 if filter_mode == "Categorical":
-    cat_candidates = [c for c in working_df.columns if working_df[c].dtype == "object" or str(working_df[c].dtype).startswith("category")]
+    cat_candidates = [c for c in df.columns if is_text_dtype(df[c]) or str(df[c].dtype).startswith("category")]
     if cat_candidates:
         cat_col = st.selectbox("Select categorical column", cat_candidates)
-        unique_vals = working_df[cat_col].dropna().astype(str).unique().tolist()
+        cat_values = take_rows(df[cat_col], working_rows)
+        unique_vals, options_truncated = category_options(cat_values)
+        if options_truncated:
+            st.caption(f"Showing the {len(unique_vals):,} most frequent values")
         selected_vals = st.multiselect("Values", unique_vals, default=unique_vals[:10] if len(unique_vals) > 10 else unique_vals)
         if selected_vals:
-            working_df = working_df[working_df[cat_col].astype(str).isin(selected_vals)]
+            working_rows = narrow_rows(working_rows, cat_values.astype(str).isin(selected_vals).to_numpy())
     else:
         st.info("No categorical columns found.")
 
 elif filter_mode == "Numeric range":
-    numeric_df, numeric_cols = safe_numeric_df(working_df)
+    numeric_df, numeric_cols = safe_numeric_df(df)
     if numeric_cols:
         num_col = st.selectbox("Select numeric column", numeric_cols)
-        min_val = float(working_df[num_col].min())
-        max_val = float(working_df[num_col].max())
+        num_values = take_rows(df[num_col], working_rows)
+        min_val = float(num_values.min())
+        max_val = float(num_values.max())
         range_vals = st.slider("Range", min_value=min_val, max_value=max_val, value=(min_val, max_val))
-        working_df = working_df[(working_df[num_col] >= range_vals[0]) & (working_df[num_col] <= range_vals[1])]
+        in_range = (num_values >= range_vals[0]) & (num_values <= range_vals[1])
+        working_rows = narrow_rows(working_rows, in_range.to_numpy(dtype=bool, na_value=False))
     else:
         st.info("No numeric columns found.")
 
-st.write(f"Rows after filters: **{len(working_df):,}**")
+st.write(f"Rows after filters: **{row_count(df, working_rows):,}**")
+
+# The analysis views need a frame, so the selected rows are gathered once.
+working_df = take_rows(df, working_rows)
 
 # -----------------------------
 # Analysis
 # -----------------------------
 st.subheader("Analysis")
 
+working_key = f"{search_key}:{row_selection_key(working_rows)}"
+working_profile = profile_columns(working_df, working_key, approx_distinct_above, distinct_precision)
+
 tab1, tab2, tab3, tab4 = st.tabs(["Summary", "Missing data", "Correlations", "Text analysis"])
 
 with tab1:
-    numeric_df, numeric_cols = safe_numeric_df(working_df)
-    if numeric_cols:
+    numeric_profile = working_profile[working_profile["numeric"]]
+    if not numeric_profile.empty:
         st.markdown("### Numeric summary")
-        st.dataframe(working_df[numeric_cols].describe().T, use_container_width=True)
+        numeric_summary = numeric_profile.set_index("column").reindex(
+            columns=["count", "mean", "std", "min", "25%", "50%", "75%", "max"]
+        )
+        st.dataframe(numeric_summary, use_container_width=True)
     else:
         st.info("No numeric columns available for summary statistics.")
 
     st.markdown("### Top values")
     top_col = st.selectbox("Choose a column for frequency counts", working_df.columns, key="top_col")
-    vc = working_df[top_col].astype(str).value_counts(dropna=False).head(20)
-    st.dataframe(vc.rename_axis("value").reset_index(name="count"), use_container_width=True)
+    st.dataframe(top_k_values(working_df[top_col], 20, dropna=False), use_container_width=True)
 
 with tab2:
-    miss = pd.DataFrame({
-        "column": working_df.columns,
-        "missing_count": [int(working_df[c].isna().sum()) for c in working_df.columns],
-        "missing_pct": [round(working_df[c].isna().mean() * 100, 2) for c in working_df.columns],
-    }).sort_values("missing_count", ascending=False)
+    miss = working_profile[["column", "missing_count", "missing_pct"]].sort_values("missing_count", ascending=False)
 
     st.dataframe(miss, use_container_width=True)
 
@@ -260,17 +421,46 @@ with tab2:
 with tab3:
     numeric_df, numeric_cols = safe_numeric_df(working_df)
     if len(numeric_cols) >= 2:
-        corr = working_df[numeric_cols].corr(numeric_only=True)
-        fig_corr = px.imshow(
-            corr,
-            text_auto=True,
-            aspect="auto",
-            color_continuous_scale="RdBu_r",
-            zmin=-1,
-            zmax=1,
-            title="Correlation matrix"
+        sample_corr = False
+        if len(working_df) > CORR_SAMPLE_ROWS:
+            sample_corr = st.checkbox(f"Estimate from a random sample of {CORR_SAMPLE_ROWS:,} rows")
+        corr, pair_rows = correlation_matrix(
+            working_df, working_key, tuple(numeric_cols), CORR_SAMPLE_ROWS if sample_corr else None
+        )
+        if sample_corr:
+            st.caption(
+                f"Estimated from {CORR_SAMPLE_ROWS:,} of {len(working_df):,} rows; "
+                "ci_low and ci_high give a 95% confidence interval for each pair"
+            )
+
+        top_pairs = st.number_input("Strongest pairs to list", min_value=1, value=CORR_TOP_PAIRS, step=5)
+        pairs = correlation_pairs(corr, pair_rows, int(top_pairs))
+        st.dataframe(pairs, use_container_width=True)
+
+        if len(numeric_cols) <= CORR_HEATMAP_MAX_COLUMNS:
+            default_heatmap_cols = numeric_cols
+        else:
+            pair_cols = set(pairs["column_a"]) | set(pairs["column_b"])
+            default_heatmap_cols = [col for col in numeric_cols if col in pair_cols][:CORR_HEATMAP_MAX_COLUMNS]
+        heatmap_cols = st.multiselect(
+            "Heatmap columns",
+            numeric_cols,
+            default=default_heatmap_cols,
+            max_selections=CORR_HEATMAP_MAX_COLUMNS
         )
-        st.plotly_chart(fig_corr, use_container_width=True)
+        if len(heatmap_cols) >= 2:
+            fig_corr = px.imshow(
+                corr.loc[heatmap_cols, heatmap_cols],
+                text_auto=".2f",
+                aspect="auto",
+                color_continuous_scale="RdBu_r",
+                zmin=-1,
+                zmax=1,
+                title="Correlation matrix"
+            )
+            show_figure(fig_corr)
+        else:
+            st.info("Choose at least two columns for the heatmap.")
     else:
         st.info("Need at least two numeric columns for correlation analysis.")
 
@@ -313,36 +503,82 @@ if chart_type in ["Bar", "Line", "Scatter"]:
 
     color_arg = None if color_col == "None" else color_col
 
+    if chart_type in ["Line", "Scatter"]:
+        point_budget = st.number_input(
+            "Point budget",
+            min_value=1_000,
+            value=CHART_POINT_BUDGET,
+            step=1_000,
+            help="Charts with more points than this are reduced on the server before they are drawn."
+        )
+    if chart_type == "Scatter" and len(working_df) > point_budget:
+        scatter_mode = st.radio("Above the budget, draw", ["Density", "Stratified sample"], horizontal=True)
+
+    plot_cols = list(dict.fromkeys([x_col, y_col] + ([color_arg] if color_arg else [])))
     if chart_type == "Bar":
-        fig = px.bar(working_df, x=x_col, y=y_col, color=color_arg, title=f"{chart_type} chart")
+        totals = bar_totals(working_df, working_key, x_col, y_col, color_arg)
+        fig = px.bar(totals, x=x_col, y=totals.columns[-1], color=color_arg, title=f"{chart_type} chart")
     elif chart_type == "Line":
-        fig = px.line(working_df, x=x_col, y=y_col, color=color_arg, title=f"{chart_type} chart")
+        plot_df = working_df
+        if len(working_df) > point_budget:
+            line_rows, reduction = lttb_rows(working_df, x_col, y_col, color_arg, point_budget)
+            plot_df = working_df[plot_cols].iloc[line_rows]
+            st.caption(f"Reduced data: {len(plot_df):,} of {len(working_df):,} points, {reduction}")
+        fig = px.line(plot_df, x=x_col, y=y_col, color=color_arg, title=f"{chart_type} chart")
     else:
-        fig = px.scatter(working_df, x=x_col, y=y_col, color=color_arg, title=f"{chart_type} chart")
-
-    st.plotly_chart(fig, use_container_width=True)
+        fig = None
+        if len(working_df) > point_budget and scatter_mode == "Density":
+            fig = density_figure(working_df, x_col, y_col, f"{chart_type} chart (density)")
+            if fig is not None:
+                st.caption(
+                    f"Reduced data: {len(working_df):,} points binned into a "
+                    f"{DENSITY_BINS}x{DENSITY_BINS} density grid; color groups are not shown"
+                )
+        if fig is None:
+            plot_df = working_df
+            if len(working_df) > point_budget:
+                plot_df = working_df[plot_cols].iloc[stratified_sample_rows(working_df, color_arg, point_budget)]
+                st.caption(
+                    f"Reduced data: a random sample of {len(plot_df):,} of {len(working_df):,} points, "
+                    "stratified by color group"
+                )
+            fig = px.scatter(plot_df, x=x_col, y=y_col, color=color_arg, title=f"{chart_type} chart")
+
+    show_figure(fig)
 
 elif chart_type == "Histogram":
     hist_col = st.selectbox("Column", numeric_cols if numeric_cols else all_cols, key="hist_col")
     bins = st.slider("Bins", 5, 100, 20)
-    fig = px.histogram(working_df, x=hist_col, nbins=bins, title="Histogram")
-    st.plotly_chart(fig, use_container_width=True)
+    fig = histogram_figure(histogram_bins(working_df, working_key, hist_col, bins), hist_col, "Histogram")
+    show_figure(fig)
 
 elif chart_type == "Box":
     y_col = st.selectbox("Numeric column", numeric_cols if numeric_cols else all_cols, key="box_y")
     x_group = st.selectbox("Group by (optional)", ["None"] + all_cols, key="box_x")
-    if x_group == "None":
-        fig = px.box(working_df, y=y_col, title="Box plot")
+    group_col = None if x_group == "None" else x_group
+    box_stats, n_groups = box_statistics(working_df, working_key, y_col, group_col)
+    if box_stats is None:
+        st.info("Box plots need a numeric or datetime column.")
     else:
-        fig = px.box(working_df, x=x_group, y=y_col, title="Box plot")
-    st.plotly_chart(fig, use_container_width=True)
+        show_figure(box_figure(box_stats, y_col, group_col, "Box plot"))
+        note = (
+            f"Whiskers reach the furthest values within 1.5 IQR; "
+            f"{int(box_stats['outliers'].sum()):,} outliers beyond them are not drawn"
+        )
+        if n_groups > len(box_stats):
+            note += f". Showing the {len(box_stats)} largest of {n_groups:,} groups"
+        st.caption(note)
 
 elif chart_type == "Pie":
     pie_col = st.selectbox("Category column", all_cols, key="pie_col")
-    pie_counts = working_df[pie_col].astype(str).value_counts().reset_index()
+    pie_counts = top_k_values(working_df[pie_col], PIE_MAX_SLICES)
+    other_count = int(working_df[pie_col].notna().sum()) - int(pie_counts["count"].sum())
+    if other_count > 0:
+        pie_counts.loc[len(pie_counts)] = ["Other", other_count]
+    pie_counts["value"] = pie_counts["value"].astype(str)
     pie_counts.columns = [pie_col, "count"]
     fig = px.pie(pie_counts, names=pie_col, values="count", title="Pie chart")
-    st.plotly_chart(fig, use_container_width=True)
+    show_figure(fig)
 
 # -----------------------------
 # Downloads
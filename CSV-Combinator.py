@@ -1,11 +1,34 @@
 import io
+import os
 import re
-import csv
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import streamlit as st
 import plotly.express as px
-import plotly.graph_objects as go
+from csv_explorer import (
+    ADMIN_TOKEN, AUTO_ENCODINGS, CHART_POINT_BUDGET, CORR_HEATMAP_MAX_COLUMNS, CORR_SAMPLE_ROWS,
+    CORR_TOP_PAIRS, DENSITY_BINS, OUT_OF_CORE_DIR, PARSE_CACHE_MAX_BYTES, PIE_MAX_SLICES,
+    PLAN_SAMPLE_ROWS, PROFILE_SAMPLE_BYTES, UPLOAD_TYPES, apply_schema_plan, arrow_search_mask,
+    bar_totals, box_figure, box_statistics, build_trigram_index, category_options,
+    combined_columns, compact_dtypes, convert_csv_to_parquet, convert_datetime_columns,
+    converted_row_fingerprints, correlation_matrix, correlation_pairs, CsvSource,
+    dataset_registry, density_figure, detect_datetime_columns, evict_parse_cache, hash_values,
+    histogram_bins, histogram_figure, hll_merge, hll_precision, hll_sketch, is_text_dtype,
+    lttb_rows, narrow_rows, narrows_search, out_of_core_path, parse_cache_path,
+    plan_combined_schema, profile_columns, profile_csv_bytes, read_csv_fast, read_parse_cache,
+    refine_search_mask, render_out_of_core_view, row_count, row_fingerprints, row_selection_key,
+    safe_numeric_df, scan_search_mask, session_token, show_figure, stratified_sample_rows,
+    stream_dedup, take_rows, top_k_values, upload_sources, write_parse_cache,
+)
 
 
 st.set_page_config(
@@ -21,121 +44,295 @@ st.caption("Upload one or more CSV files, combine them, search, inspect, analyze
 # -----------------------------
 # Helpers
 # -----------------------------
-def detect_separator(file_bytes: bytes, fallback=",") -> str:
-    sample = file_bytes[:5000].decode("utf-8", errors="ignore")
-    try:
-        dialect = csv.Sniffer().sniff(sample, delimiters=[",", ";", "\t", "|"])
-        return dialect.delimiter
-    except Exception:
-        return fallback
-
-
-@st.cache_data
-def read_single_csv(file_bytes: bytes, file_name: str, encoding: str, separator: str, combine_mode: str):
-    df_part = pd.read_csv(io.BytesIO(file_bytes), encoding=encoding, sep=separator)
-    df_part["source_file"] = file_name
-    return df_part
-
-
-@st.cache_data
-def load_and_combine_csvs(file_bytes_list, file_names, encoding_choice, separator_mode, combine_mode):
-    dfs = []
-    file_summaries = []
-    errors = []
-
-    fallback_encodings = ["utf-8", "utf-8-sig", "cp1256", "latin1"]
+def parse_uploaded_csv(source: CsvSource, encoding_choice: str, separator_mode: str):
+    file_name = source.name
+    cache_path = parse_cache_path(source.fingerprint, encoding_choice=encoding_choice, separator_mode=separator_mode)
+    start = time.perf_counter()
+    df_part, meta = read_parse_cache(cache_path)
+    if df_part is not None:
+        seconds = max(time.perf_counter() - start, 1e-9)
+        summary = {
+            "file_name": file_name,
+            "rows": len(df_part),
+            "columns": len(df_part.columns) + len(SOURCE_COLUMNS),
+            **meta,
+            "engine": "parse cache",
+            "mb_per_s": round(source.size / 1_000_000 / seconds, 1),
+            "status": "Loaded"
+        }
+        return df_part, summary, None
 
-    for file_bytes, file_name in zip(file_bytes_list, file_names):
-        chosen_sep = detect_separator(file_bytes) if separator_mode == "Auto detect" else separator_mode
+    try:
+        head = source.head(PROFILE_SAMPLE_BYTES + 1)
+    except Exception as e:
+        error = f"Could not decompress: {e}"
+        summary = {"file_name": file_name, "rows": 0, "columns": 0, "status": f"Failed: {error}"}
+        return None, summary, {"file_name": file_name, "error": error}
+    profile = profile_csv_bytes(head, encoding_choice, separator_mode)
+    chosen_sep = profile["separator"]
+    read_kwargs = {
+        "sep": chosen_sep,
+        "quotechar": profile["quotechar"],
+        "header": 0 if profile["header_row"] is not None else None,
+        "skiprows": profile["skip_rows"] or None,
+    }
+    detected = {
+        "separator": chosen_sep,
+        "encoding_used": None,
+        "bom": profile["bom"],
+        "quotechar": profile["quotechar"],
+        "header_row": profile["header_row"],
+    }
 
-        read_success = False
-        attempted_encodings = fallback_encodings if encoding_choice == "Auto try common encodings" else [encoding_choice]
+    # The sample only covers the start of the file; if a later byte does not
+    # decode, retry the remaining auto encodings instead of failing outright.
+    attempted_encodings = [profile["encoding"]]
+    if encoding_choice == "Auto try common encodings":
+        attempted_encodings += [enc for enc in AUTO_ENCODINGS if enc != profile["encoding"]]
 
-        last_error = None
-        for enc in attempted_encodings:
-            try:
-                df_part = pd.read_csv(io.BytesIO(file_bytes), encoding=enc, sep=chosen_sep)
-                df_part["source_file"] = file_name
-                df_part["source_separator"] = chosen_sep
-                df_part["source_encoding"] = enc
-                dfs.append(df_part)
-
-                file_summaries.append({
-                    "file_name": file_name,
-                    "rows": len(df_part),
-                    "columns": len(df_part.columns),
-                    "separator": chosen_sep,
-                    "encoding_used": enc,
-                    "status": "Loaded"
-                })
-                read_success = True
-                break
-            except Exception as e:
-                last_error = str(e)
+    last_error = None
+    for enc in attempted_encodings:
+        try:
+            df_part, parse_stats = read_csv_fast(source, encoding=enc, **read_kwargs)
+            if read_kwargs["header"] is None:
+                df_part.columns = [f"column_{i + 1}" for i in range(len(df_part.columns))]
+            detected["encoding_used"] = enc
+            write_parse_cache(cache_path, df_part, detected)
 
-        if not read_success:
-            errors.append({"file_name": file_name, "error": last_error})
-            file_summaries.append({
+            summary = {
                 "file_name": file_name,
-                "rows": 0,
-                "columns": 0,
-                "separator": chosen_sep,
-                "encoding_used": None,
-                "status": f"Failed: {last_error}"
-            })
-
-    if not dfs:
-        raise ValueError("None of the uploaded CSV files could be read.")
-
+                "rows": len(df_part),
+                "columns": len(df_part.columns) + len(SOURCE_COLUMNS),
+                **detected,
+                "engine": parse_stats["engine"],
+                "mb_per_s": parse_stats["mb_per_s"],
+                "status": "Loaded"
+            }
+            return df_part, summary, None
+        except Exception as e:
+            last_error = str(e)
+
+    summary = {
+        "file_name": file_name,
+        "rows": 0,
+        "columns": 0,
+        **detected,
+        "engine": None,
+        "mb_per_s": None,
+        "status": f"Failed: {last_error}"
+    }
+    return None, summary, {"file_name": file_name, "error": last_error}
+
+
+SOURCE_COLUMNS = ["source_file", "source_separator", "source_encoding"]
+
+
+def stamp_source_columns(df: pd.DataFrame, block_lengths, provenance: dict) -> pd.DataFrame:
+    # Provenance is constant within a file's block of rows, so each column is
+    # a categorical whose codes repeat per block: one small code per row
+    # instead of a repeated string.
+    df = df.copy(deep=False)
+    for col, values in provenance.items():
+        dtype = pd.CategoricalDtype(pd.unique(pd.Series(values, dtype=object)))
+        codes = np.repeat(dtype.categories.get_indexer(values), block_lengths)
+        df[col] = pd.Categorical.from_codes(codes, dtype=dtype)
+    return df
+
+
+def parse_blocks(sources, encoding_choice, separator_mode, max_workers=1) -> list:
+    # Files are independent, so parse them on a thread pool (pyarrow
+    # releases the GIL). Files already in the parse cache come back
+    # memory-mapped instead of being parsed again.
+    results = [None] * len(sources)
+    progress = st.progress(0.0, text=f"Parsing {len(sources)} file(s)...")
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {
+            pool.submit(parse_uploaded_csv, source, encoding_choice, separator_mode): i
+            for i, source in enumerate(sources)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            results[i] = future.result()
+            progress.progress(done / len(futures), text=f"Parsed {sources[i].name} ({done}/{len(futures)})")
+    progress.empty()
+    return results
+
+
+def kept_blocks(previous_keys, keys):
+    # Which previous blocks survive when keys is previous_keys with some
+    # entries removed and the rest in the same order; None otherwise.
+    if len(set(previous_keys)) != len(previous_keys) or len(keys) >= len(previous_keys):
+        return None
+    remaining = iter(keys)
+    wanted = next(remaining, None)
+    kept = []
+    for key in previous_keys:
+        kept.append(key == wanted)
+        if key == wanted:
+            wanted = next(remaining, None)
+    return kept if wanted is None else None
+
+
+def combine_uploads(sources, encoding_choice, separator_mode, combine_mode, dedup_mode=None, plans=None,
+                    max_workers=1, previous=None):
+    # Each file is a block keyed by its fingerprint and parse options only;
+    # blocks live in the parse cache and are memory-mapped back, so the
+    # combined frame is the only resident copy. Blocks are cast to their
+    # schema plan when combined, so a plan changed by another file costs a
+    # cast, not a parse. previous is the session's last registry entry: when
+    # uploads were only appended under unchanged plans, its frame is
+    # extended with the new blocks; when they were only removed, their rows
+    # are dropped from it. Anything else is rebuilt from the blocks.
+    # Returns the combined frame, file summary, errors, a note on what was
+    # reused, and the combination metadata to register with the frame.
+    plans = plans or [None] * len(sources)
     join_type = "outer" if combine_mode == "Append rows (keep all columns)" else "inner"
-    combined_df = pd.concat(dfs, ignore_index=True, sort=False, join=join_type)
+    block_keys = [json.dumps([source.fingerprint, encoding_choice, separator_mode]) for source in sources]
+    results = parse_blocks(sources, encoding_choice, separator_mode, max_workers)
+    loaded = [i for i, (df_part, _, _) in enumerate(results) if df_part is not None]
+    if not loaded:
+        raise ValueError("None of the uploaded CSV files could be read.")
+    file_summaries = [dict(summary) for _, summary, _ in results]
+    errors = [error for _, _, error in results if error is not None]
+
+    keys = [block_keys[i] for i in loaded]
+    file_plans = [plans[i] for i in loaded]
+
+    def planned_blocks(start=0, stop=None):
+        dfs = []
+        for i in loaded[start:stop]:
+            df_part, file_summaries[i]["schema_planned"] = apply_schema_plan(results[i][0], plans[i])
+            dfs.append(df_part)
+        return dfs
+
+    provenance = {
+        "source_file": [sources[i].name for i in loaded],
+        "source_separator": [file_summaries[i]["separator"] for i in loaded],
+        "source_encoding": [file_summaries[i]["encoding_used"] for i in loaded],
+    }
+    constants = [{col: values[j] for col, values in provenance.items()} for j in range(len(loaded))]
+    columns = combined_columns([results[i][0].columns for i in loaded], join_type)
+    dedup_columns = None
+    if dedup_mode is not None:
+        dedup_columns = columns + SOURCE_COLUMNS
+        if dedup_mode == "Ignore source columns":
+            dedup_columns = columns
+        dedup_columns = dedup_columns or None
+
+    previous_frame = None
+    if previous is not None:
+        previous_frame = previous["df"].drop(columns=SOURCE_COLUMNS)
+        previous = previous["combination"]
+    if previous is not None and previous["options"] != [join_type, dedup_mode]:
+        previous = None
+    n_previous = len(previous["keys"]) if previous is not None else 0
+    kept = kept_blocks(previous["keys"], keys) if previous is not None else None
+
+    if (previous is not None and n_previous < len(keys) and keys[:n_previous] == previous["keys"]
+            and file_plans[:n_previous] == previous["plans"]
+            and columns[:len(previous["columns"])] == previous["columns"]
+            and (join_type == "outer" or columns == previous["columns"])):
+        how = f"Appended {len(keys) - n_previous} file(s) to the previous combination"
+        for i, planned in zip(loaded, previous["planned"]):
+            file_summaries[i]["schema_planned"] = planned
+        dfs = planned_blocks(n_previous)
+        removed = [None] * len(dfs)
+        if dedup_columns:
+            # Seed from the earlier files' own blocks: the concatenated frame
+            # may have upcast their columns, which would change their hashes.
+            # Their duplicates hash like rows already kept, so the full blocks
+            # give the same seen set as the kept rows.
+            seen_parts = list(zip(planned_blocks(0, n_previous), constants))
+            removed = stream_dedup(dfs, dedup_columns, constants[n_previous:], seen_parts)
+        frame = pd.concat([previous_frame, *dfs], ignore_index=True, sort=False, join=join_type)
+        lengths = previous["lengths"] + [len(df_part) for df_part in dfs]
+        removed = previous["removed"] + removed
+    elif (previous is not None and kept is not None and dedup_columns is None
+            and file_plans == [plan for plan, keep in zip(previous["plans"], kept) if keep]
+            and (join_type == "outer" or columns == previous["columns"])):
+        how = f"Dropped {n_previous - len(keys)} file(s) from the previous combination"
+        for i, planned in zip(loaded, (planned for planned, keep in zip(previous["planned"], kept) if keep)):
+            file_summaries[i]["schema_planned"] = planned
+        rows = np.repeat(kept, previous["lengths"])
+        frame = previous_frame.loc[rows, columns].reset_index(drop=True)
+        lengths = [length for length, keep in zip(previous["lengths"], kept) if keep]
+        removed = [None] * len(keys)
+    else:
+        how = None
+        dfs = planned_blocks()
+        removed = [None] * len(dfs)
+        if dedup_columns:
+            removed = stream_dedup(dfs, dedup_columns, constants)
+        frame = pd.concat(dfs, ignore_index=True, sort=False, join=join_type)
+        lengths = [len(df_part) for df_part in dfs]
+        del dfs
+
+    del previous_frame
+    combination = {
+        "options": [join_type, dedup_mode],
+        "keys": keys,
+        "plans": file_plans,
+        "planned": [file_summaries[i]["schema_planned"] for i in loaded],
+        "columns": columns,
+        "lengths": lengths,
+        "removed": removed,
+    }
+    combined_df = stamp_source_columns(frame, lengths, provenance)
 
+    if dedup_columns:
+        for i, count in zip(loaded, removed):
+            file_summaries[i]["duplicates_removed"] = count
     summary_df = pd.DataFrame(file_summaries)
     error_df = pd.DataFrame(errors) if errors else pd.DataFrame(columns=["file_name", "error"])
 
-    return combined_df, summary_df, error_df
-
-
-def build_search_series(df: pd.DataFrame) -> pd.Series:
-    return df.astype(str).fillna("").agg(" | ".join, axis=1)
-
-
-def detect_datetime_columns(df: pd.DataFrame):
-    datetime_cols = []
-    for col in df.columns:
-        sample = df[col].dropna()
-        if sample.empty:
-            continue
-        converted = pd.to_datetime(sample.head(200), errors="coerce", utc=True)
-        if converted.notna().mean() > 0.6:
-            datetime_cols.append(col)
-    return datetime_cols
-
-
-def convert_datetime_columns(df: pd.DataFrame, cols):
-    out = df.copy()
-    for col in cols:
-        out[col] = pd.to_datetime(out[col], errors="coerce", utc=True)
-    return out
-
-
-def safe_numeric_df(df: pd.DataFrame):
-    numeric_cols = df.select_dtypes(include=np.number).columns.tolist()
-    return df[numeric_cols], numeric_cols
+    return combined_df, summary_df, error_df, how, combination
+
+
+@st.cache_data(show_spinner="Sketching distinct values per file...")
+def source_sketches(_df: pd.DataFrame, sketch_key: str, precision: int) -> dict:
+    # One HyperLogLog sketch per (source file, column). Sketches merge by
+    # register-wise max, so any selection of files gets its distinct
+    # estimates without rescanning the rows.
+    codes = _df["source_file"].cat.codes.to_numpy()
+    sources = _df["source_file"].cat.categories.astype(str)
+    sketches = {source: {} for source in sources}
+    for col in _df.columns:
+        present = _df[col].notna().to_numpy()
+        hashes = hash_values(_df[col])
+        present_codes = codes[present]
+        for i, source in enumerate(sources):
+            sketches[source][col] = hll_sketch(hashes[present_codes == i], precision)
+    return sketches
+
+
+def file_overlap(hashes: pd.Series, sources: pd.Series) -> pd.DataFrame:
+    # Distinct rows shared by each pair of files; the diagonal holds each
+    # file's distinct row count.
+    pairs = pd.DataFrame({"hash": hashes.to_numpy(), "source": sources.cat.codes.to_numpy()}).drop_duplicates()
+    codes = np.sort(pairs["source"].unique())
+    shared = pairs[pairs["hash"].duplicated(keep=False)]
+    membership = pd.crosstab(shared["hash"], shared["source"]).reindex(columns=codes, fill_value=0)
+    overlap = (membership.T @ membership).reindex(index=codes, columns=codes, fill_value=0)
+    distinct_rows = pairs.groupby("source").size().reindex(codes)
+    values = overlap.to_numpy(copy=True)
+    np.fill_diagonal(values, distinct_rows.to_numpy())
+    files = sources.cat.categories.astype(str)[codes]
+    return pd.DataFrame(values, index=pd.Index(files, name="source_file"), columns=files)
 
 
 def text_column_candidates(df: pd.DataFrame):
-    return [col for col in df.columns if df[col].dtype == "object"]
+    return [col for col in df.columns if is_text_dtype(df[col])]
 
 
 def keyword_frequency(df: pd.DataFrame, text_col: str, top_n: int = 20):
     text = (
         df[text_col]
+        .astype(object)
         .fillna("")
         .astype(str)
         .str.lower()
         .str.replace(r"http\S+", " ", regex=True)
-        .str.replace(r"[^\w\s\u0600-\u06FF]", " ", regex=True)
+        .str.replace("[^\\w\\s\u0600-\u06FF]", " ", regex=True)
         .str.replace(r"\s+", " ", regex=True)
     )
     words = " ".join(text.tolist()).split()
@@ -157,6 +354,51 @@ def dataframe_to_excel_bytes(df: pd.DataFrame) -> bytes:
     return output.getvalue()
 
 
+def unify_parquet_schemas(schemas) -> pa.Schema:
+    # Permissive promotion first; a column whose types cannot be promoted
+    # (int64 in one file, string in another) falls back to string.
+    try:
+        return pa.unify_schemas(schemas, promote_options="permissive")
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        pass
+    fields = {}
+    for schema in schemas:
+        for field in schema:
+            if field.name in fields:
+                try:
+                    field = pa.unify_schemas(
+                        [pa.schema([fields[field.name]]), pa.schema([field])], promote_options="permissive"
+                    ).field(0)
+                except (pa.ArrowTypeError, pa.ArrowInvalid):
+                    field = pa.field(field.name, pa.string())
+            fields[field.name] = field
+    return pa.schema(list(fields.values()))
+
+
+def cast_parquet(path: Path, schema: pa.Schema) -> Path:
+    # Dataset scans cast fragments to the dataset schema, but filters are
+    # pushed down against each file's own types, so a file that disagrees
+    # with the unified schema is rewritten once with its columns cast.
+    file_schema = pq.read_schema(path)
+    target = pa.schema([schema.field(name) for name in file_schema.names])
+    if target.equals(file_schema):
+        return path
+    digest = hashlib.blake2b(str(target).encode(), digest_size=8).hexdigest()
+    cast_path = path.with_name(f"{path.stem}.{digest}.parquet")
+    try:
+        os.utime(cast_path)
+        return cast_path
+    except FileNotFoundError:
+        pass
+    tmp_path = cast_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with pq.ParquetWriter(tmp_path, target) as writer:
+        for batch in pq.ParquetFile(path).iter_batches():
+            writer.write_batch(batch.cast(target))
+    os.replace(tmp_path, cast_path)
+    evict_parse_cache(PARSE_CACHE_MAX_BYTES, keep=cast_path, directory=OUT_OF_CORE_DIR)
+    return cast_path
+
+
 # -----------------------------
 # Sidebar
 # -----------------------------
@@ -164,7 +406,8 @@ st.sidebar.header("Upload")
 
 uploaded_files = st.sidebar.file_uploader(
     "Upload CSV file(s)",
-    type=["csv"],
+    type=UPLOAD_TYPES,
+    help="Also accepts .csv.gz, .csv.bz2 and .csv.zst files, and .zip archives whose CSVs become separate source files.",
     accept_multiple_files=True
 )
 
@@ -191,6 +434,51 @@ duplicate_subset_mode = st.sidebar.radio(
     ["All columns", "Ignore source columns"],
     horizontal=False
 )
+dedup_mode = duplicate_subset_mode if remove_duplicates else None
+
+parse_workers = st.sidebar.number_input(
+    "Parallel parse workers",
+    min_value=1,
+    max_value=32,
+    value=min(4, os.cpu_count() or 1)
+)
+
+out_of_core_mb = st.sidebar.number_input(
+    "Out-of-core mode above (MB)",
+    min_value=1,
+    value=1024,
+    step=256,
+    help="Larger uploads are converted to Parquet on disk and queried there instead of being loaded into memory."
+)
+
+compact_types = st.sidebar.checkbox(
+    "Compact column types after load",
+    value=False,
+    help="Store low-cardinality text as categories, other text as Arrow strings, and downcast numbers where values allow."
+)
+
+approx_distinct_above = st.sidebar.number_input(
+    "Approximate distinct counts above (rows)",
+    min_value=0,
+    value=1_000_000,
+    step=100_000,
+    help="Columns with more rows than this get HyperLogLog distinct estimates instead of exact counts."
+)
+distinct_error_pct = st.sidebar.number_input(
+    "Distinct estimate error (%)",
+    min_value=0.5,
+    max_value=25.0,
+    value=1.0,
+    step=0.5
+)
+distinct_precision = hll_precision(distinct_error_pct / 100)
+
+registry = dataset_registry()
+if ADMIN_TOKEN and st.query_params.get("admin") == ADMIN_TOKEN:
+    with st.sidebar.expander("Resident datasets", expanded=False):
+        resident = registry.summary()
+        st.caption(f"{len(resident)} dataset(s), {resident['memory_mb'].sum():,.1f} MB shared across sessions")
+        st.dataframe(resident, use_container_width=True)
 
 if not uploaded_files:
     st.info("Upload one or more CSV files from the sidebar to begin.")
@@ -201,28 +489,135 @@ if not uploaded_files:
 # Load data
 # -----------------------------
 try:
-    file_bytes_list = [file.getvalue() for file in uploaded_files]
-    file_names = [file.name for file in uploaded_files]
-    df, upload_summary, error_df = load_and_combine_csvs(
-        file_bytes_list=file_bytes_list,
-        file_names=file_names,
+    sources = [source for file in uploaded_files for source in upload_sources(file)]
+except Exception as e:
+    st.error(f"Could not read the uploaded file(s): {e}")
+    st.stop()
+if not sources:
+    st.error("The uploaded archive(s) contain no CSV files.")
+    st.stop()
+
+if sum(source.size for source in sources) > out_of_core_mb * 1_000_000:
+    parquet_paths = []
+    for source in sources:
+        try:
+            profile = profile_csv_bytes(source.head(PROFILE_SAMPLE_BYTES + 1), encoding_choice, separator_mode)
+        except Exception as e:
+            st.warning(f"Could not read {source.name}: {e}")
+            continue
+        attempted_encodings = [profile["encoding"]]
+        if encoding_choice == "Auto try common encodings":
+            attempted_encodings += [enc for enc in AUTO_ENCODINGS if enc != profile["encoding"]]
+        for enc in attempted_encodings:
+            try:
+                with st.spinner(f"Converting {source.name} to Parquet for out-of-core mode..."):
+                    parquet_paths.append(convert_csv_to_parquet(
+                        source,
+                        out_of_core_path(source.fingerprint, file_name=source.name, encoding=enc,
+                                         separator=profile["separator"]),
+                        enc,
+                        delimiter=profile["separator"],
+                        skip_rows=profile["skip_rows"],
+                        has_header=profile["header_row"] is not None,
+                        constant_columns={
+                            "source_file": source.name,
+                            "source_separator": profile["separator"],
+                            "source_encoding": enc,
+                        }
+                    ))
+                break
+            except Exception as e:
+                last_error = e
+        else:
+            st.warning(f"Could not read {source.name}: {last_error}")
+
+    if not parquet_paths:
+        st.error("None of the uploaded CSV files could be read.")
+        st.stop()
+
+    schemas = [pq.read_schema(path) for path in parquet_paths]
+    unified_schema = unify_parquet_schemas(schemas)
+    try:
+        parquet_paths = [cast_parquet(path, unified_schema) for path in parquet_paths]
+    except (pa.ArrowException, OSError) as e:
+        st.error(f"Could not align column types across files: {e}")
+        st.stop()
+    dataset = ds.dataset([str(path) for path in parquet_paths], format="parquet", schema=unified_schema)
+    if combine_mode == "Append rows (keep all columns)":
+        ooc_columns = dataset.schema.names
+    else:
+        shared = set.intersection(*(set(schema.names) for schema in schemas))
+        ooc_columns = [c for c in dataset.schema.names if c in shared]
+    if remove_duplicates:
+        st.caption("Duplicate removal is not applied in out-of-core mode.")
+    render_out_of_core_view(dataset, ooc_columns, source_column="source_file")
+    st.stop()
+
+file_names = [source.name for source in sources]
+fingerprints = [source.fingerprint for source in sources]
+try:
+    schema_plans, planned_schema = plan_combined_schema(
+        _sources=sources,
+        fingerprints=fingerprints,
         encoding_choice=encoding_choice,
         separator_mode=separator_mode,
         combine_mode=combine_mode
     )
+    with st.expander("Planned schema", expanded=False):
+        st.caption(f"From headers and the first {PLAN_SAMPLE_ROWS:,} rows of each file")
+        st.dataframe(planned_schema, use_container_width=True)
 except Exception as e:
     st.error(f"Could not read the uploaded file(s): {e}")
     st.stop()
 
-original_df = df.copy()
-
-if remove_duplicates:
-    if duplicate_subset_mode == "Ignore source columns":
-        subset_cols = [c for c in df.columns if c not in ["source_file", "source_separator", "source_encoding"]]
-        if subset_cols:
-            df = df.drop_duplicates(subset=subset_cols).copy()
-    else:
-        df = df.drop_duplicates().copy()
+# The combined frame and its row hashes live in the shared registry; this
+# session only keeps its own selections and widget state. Acquiring a new
+# key evicts the session's previous dataset unless another session uses it,
+# so a reference is held here for combine_uploads to extend or trim.
+dataset_key = "|".join(fingerprints + file_names + [encoding_choice, separator_mode, combine_mode, str(dedup_mode)])
+previous = registry.current(session_token())
+if previous is not None and previous.get("combination") is None:
+    previous = None
+dataset = registry.acquire(f"{dataset_key}:{compact_types}", session_token())
+if dataset is None:
+    try:
+        df, upload_summary, error_df, combine_note, combination = combine_uploads(
+            sources=sources,
+            encoding_choice=encoding_choice,
+            separator_mode=separator_mode,
+            combine_mode=combine_mode,
+            dedup_mode=dedup_mode,
+            plans=schema_plans,
+            max_workers=parse_workers,
+            previous=previous
+        )
+        if combine_note:
+            st.caption(combine_note)
+    except Exception as e:
+        st.error(f"Could not read the uploaded file(s): {e}")
+        st.stop()
+    previous = None
+    memory_report = None
+    if compact_types:
+        # A compacted frame no longer matches freshly parsed blocks, so it
+        # cannot be extended or trimmed by the next combination.
+        combination = None
+        with st.spinner("Compacting column types..."):
+            df, memory_report = compact_dtypes(df)
+    with st.spinner("Fingerprinting rows..."):
+        row_hashes = row_fingerprints(df, ignore_columns=tuple(SOURCE_COLUMNS))
+    dataset = registry.put(
+        f"{dataset_key}:{compact_types}", df,
+        name=f"{len(file_names)} file(s): {', '.join(file_names)}",
+        upload_summary=upload_summary, error_df=error_df, memory_report=memory_report, row_hashes=row_hashes,
+        combination=combination
+    )
+previous = None
+df = dataset["df"]
+upload_summary = dataset["upload_summary"]
+error_df = dataset["error_df"]
+memory_report = dataset["memory_report"]
+row_hashes = dataset["row_hashes"]
 
 
 # -----------------------------
@@ -231,6 +626,17 @@ if remove_duplicates:
 st.subheader("Uploaded files")
 st.dataframe(upload_summary, use_container_width=True)
 
+total_mb = sum(source.size for source in sources) / 1_000_000
+compressed_mb = sum(source.compressed_size for source in sources if source.compressed_size is not None) / 1_000_000
+rates = upload_summary["mb_per_s"].dropna()
+if not rates.empty:
+    approx = "about " if any(source.size_estimated for source in sources) else ""
+    compressed_note = f" ({compressed_mb:,.2f} MB of compressed uploads)" if compressed_mb else ""
+    st.caption(
+        f"Parsed {approx}{total_mb:,.2f} MB of CSV{compressed_note}; "
+        f"median throughput {rates.median():,.1f} MB/s per file"
+    )
+
 if not error_df.empty:
     with st.expander("Files with errors", expanded=False):
         st.dataframe(error_df, use_container_width=True)
@@ -239,30 +645,55 @@ if not error_df.empty:
 # -----------------------------
 # Optional datetime conversion
 # -----------------------------
-datetime_candidates = detect_datetime_columns(df)
-if datetime_candidates:
+selected_dt_cols = []
+datetime_formats = detect_datetime_columns(df, f"{dataset_key}:{compact_types}")
+if datetime_formats:
     selected_dt_cols = st.sidebar.multiselect(
         "Datetime columns to parse",
-        options=datetime_candidates,
-        default=[]
+        options=list(datetime_formats),
+        default=[],
+        format_func=lambda col: f"{col} ({datetime_formats[col] or 'mixed formats'})"
     )
+    mixed_dt_cols = [col for col in selected_dt_cols if datetime_formats[col] is None]
+    if mixed_dt_cols:
+        st.warning(
+            f"No single date format fits {', '.join(mixed_dt_cols)}; "
+            "these columns are parsed value by value, which is much slower."
+        )
     if selected_dt_cols:
-        df = convert_datetime_columns(df, selected_dt_cols)
+        df, unparsed_dates = convert_datetime_columns(
+            df, {col: datetime_formats[col] for col in selected_dt_cols}, f"{dataset_key}:{compact_types}"
+        )
+        for col, count in unparsed_dates.items():
+            if count:
+                st.caption(f"{count:,} values in {col} did not match {datetime_formats[col] or 'any date format'} and are empty")
+
+search_key = "|".join(
+    [dataset_key, str(compact_types)] + selected_dt_cols
+)
+if selected_dt_cols:
+    row_hashes = converted_row_fingerprints(df, search_key, ignore_columns=tuple(SOURCE_COLUMNS))
 
 
 # -----------------------------
 # Global source filter
 # -----------------------------
+# The filters below narrow positions into df instead of copying it.
+source_mask = None
+source_rows = None
 if "source_file" in df.columns:
     st.sidebar.header("Source filter")
-    source_options = sorted(df["source_file"].dropna().astype(str).unique().tolist())
+    source_codes = df["source_file"].cat.codes.to_numpy()
+    source_categories = df["source_file"].cat.categories.astype(str)
+    source_options = sorted(source_categories[np.unique(source_codes[source_codes >= 0])].tolist())
     selected_sources = st.sidebar.multiselect(
         "Filter by source file",
         options=source_options,
         default=source_options
     )
-    if selected_sources:
-        df = df[df["source_file"].astype(str).isin(selected_sources)].copy()
+    if selected_sources and len(selected_sources) < len(source_options):
+        source_mask = np.isin(source_codes, source_categories.get_indexer(selected_sources))
+        source_rows = np.flatnonzero(source_mask)
 
 
 # -----------------------------
@@ -271,21 +702,41 @@ if "source_file" in df.columns:
 st.subheader("Dataset overview")
 
 c1, c2, c3, c4, c5 = st.columns(5)
-c1.metric("Rows", f"{df.shape[0]:,}")
+c1.metric("Rows", f"{row_count(df, source_rows):,}")
 c2.metric("Columns", f"{df.shape[1]:,}")
-c3.metric("Missing cells", f"{int(df.isna().sum().sum()):,}")
-dup_count = int(df.duplicated().sum())
+overview_sketches = None
+if "source_file" in df.columns and row_count(df, source_rows) > approx_distinct_above:
+    file_sketches = source_sketches(df, search_key, distinct_precision)
+    overview_files = [src for src in file_sketches if not selected_sources or src in selected_sources]
+    overview_sketches = {
+        col: hll_merge(file_sketches[src][col] for src in overview_files)
+        for col in df.columns
+    }
+overview_profile = profile_columns(
+    df, f"{search_key}:{row_selection_key(source_rows)}", approx_distinct_above, distinct_precision,
+    _sketches=overview_sketches, _rows=source_rows
+)
+c3.metric("Missing cells", f"{int(overview_profile['missing_count'].sum()):,}")
+dup_count = int(take_rows(row_hashes["all_columns"], source_rows).duplicated().sum())
 c4.metric("Duplicate rows", f"{dup_count:,}")
-c5.metric("Source files", f"{df['source_file'].nunique():,}" if "source_file" in df.columns else "1")
+c5.metric("Source files", f"{take_rows(df['source_file'], source_rows).nunique():,}" if "source_file" in df.columns else "1")
 
 with st.expander("Column information", expanded=False):
-    info_df = pd.DataFrame({
-        "column": df.columns,
-        "dtype": [str(df[c].dtype) for c in df.columns],
-        "missing_count": [int(df[c].isna().sum()) for c in df.columns],
-        "missing_pct": [round(df[c].isna().mean() * 100, 2) for c in df.columns],
-        "unique_values": [int(df[c].nunique(dropna=True)) for c in df.columns],
-    })
+    info_df = overview_profile[
+        ["column", "dtype", "missing_count", "missing_pct", "unique_values", "unique_estimated"]
+    ].copy()
+    if info_df["unique_estimated"].any():
+        st.caption(
+            f"unique_values marked as estimated use HyperLogLog "
+            f"(about {distinct_error_pct:g}% standard error)"
+        )
+    if memory_report is not None:
+        info_df["memory_mb_before"] = info_df["column"].map(memory_report["memory_mb_before"])
+        info_df["memory_mb_after"] = info_df["column"].map(memory_report["memory_mb_after"])
+        st.caption(
+            f"Memory: {memory_report['memory_mb_before'].sum():,.1f} MB before compaction, "
+            f"{memory_report['memory_mb_after'].sum():,.1f} MB after"
+        )
     st.dataframe(info_df, use_container_width=True)
 
 
@@ -295,7 +746,7 @@ with st.expander("Column information", expanded=False):
 st.subheader("Data preview")
 
 preview_rows = st.slider("Preview rows", min_value=5, max_value=200, value=20, step=5)
-st.dataframe(df.head(preview_rows), use_container_width=True)
+st.dataframe(take_rows(df, source_rows, limit=preview_rows), use_container_width=True)
 
 
 # -----------------------------
@@ -306,34 +757,65 @@ st.subheader("Search")
 search_text = st.text_input("Search across all columns")
 case_sensitive = st.checkbox("Case sensitive", value=False)
 use_regex = st.checkbox("Use regex", value=False)
+search_engine = st.radio(
+    "Search engine",
+    ["Trigram index", "Column-wise (Arrow)", "Full scan"],
+    horizontal=True,
+    help="The trigram index is built once per dataset and shared across sessions. "
+         "Column-wise search matches each cell with Arrow kernels. Queries an engine cannot answer "
+         "exactly, such as a regex with . or anchors that could span cells, fall back to a full scan."
+)
 
-filtered_df = df.copy()
+search_rows = source_rows
 
 if search_text.strip():
-    search_series = build_search_series(df)
-
-    if use_regex:
-        try:
-            flags = 0 if case_sensitive else re.IGNORECASE
-            mask = search_series.str.contains(search_text, regex=True, na=False, flags=flags)
-        except re.error as e:
-            st.error(f"Invalid regex: {e}")
-            st.stop()
-    else:
-        needle = search_text if case_sensitive else search_text.lower()
-        haystack = search_series if case_sensitive else search_series.str.lower()
-        mask = haystack.str.contains(re.escape(needle), regex=True, na=False)
-
-    filtered_df = df[mask].copy()
+    search_scope = "|".join([search_key, search_engine])
+    previous = st.session_state.get("last_search")
+    try:
+        if (
+            previous is not None and previous["scope"] == search_scope
+            and narrows_search(previous, search_text, case_sensitive, use_regex)
+        ):
+            mask = refine_search_mask(df, previous["rows"], search_text, case_sensitive, use_regex, search_engine)
+            st.caption(f"Refined within the previous {len(previous['rows']):,} matches")
+        else:
+            result = None
+            if search_engine == "Trigram index":
+                index = build_trigram_index(df, search_key)
+                result = index.search(df, search_text, case_sensitive, use_regex)
+                if result is not None:
+                    mask, verified = result
+                    st.caption(f"Answered from the trigram index ({verified:,} candidates verified)")
+            elif search_engine == "Column-wise (Arrow)":
+                result = arrow_search_mask(df, search_text, case_sensitive, use_regex)
+                if result is not None:
+                    mask, scanned = result
+                    st.caption(f"Matched column by column ({scanned} of {len(df.columns)} columns scanned)")
+            if result is None:
+                mask = scan_search_mask(df, search_text, case_sensitive, use_regex)
+    except re.error as e:
+        st.error(f"Invalid regex: {e}")
+        st.stop()
+
+    st.session_state["last_search"] = {
+        "scope": search_scope,
+        "text": search_text,
+        "case_sensitive": case_sensitive,
+        "use_regex": use_regex,
+        "rows": np.flatnonzero(mask),
+    }
+    if source_mask is not None:
+        mask = mask & source_mask
+    search_rows = np.flatnonzero(mask)
 
-st.write(f"Matching rows: **{len(filtered_df):,}**")
-st.dataframe(filtered_df.head(500), use_container_width=True)
+st.write(f"Matching rows: **{row_count(df, search_rows):,}**")
+st.dataframe(take_rows(df, search_rows, limit=500), use_container_width=True)
 
-if not filtered_df.empty:
+if row_count(df, search_rows):
     st.markdown("### Full row viewer")
-    row_index_options = filtered_df.index.tolist()
+    row_index_options = (df.index if search_rows is None else df.index[search_rows]).tolist()
     selected_row_idx = st.selectbox("Choose a row index", row_index_options)
-    selected_row = filtered_df.loc[selected_row_idx]
+    selected_row = df.loc[selected_row_idx]
 
     row_display = pd.DataFrame({
         "column": selected_row.index,
@@ -351,38 +833,46 @@ if not filtered_df.empty:
 st.subheader("Filters")
 
 filter_mode = st.radio("Choose filter mode", ["None", "Categorical", "Numeric range"], horizontal=True)
-working_df = filtered_df.copy()
+working_rows = search_rows
 
 if filter_mode == "Categorical":
     cat_candidates = [
-        c for c in working_df.columns
-        if working_df[c].dtype == "object" or str(working_df[c].dtype).startswith("category")
+        c for c in df.columns
+        if is_text_dtype(df[c]) or str(df[c].dtype).startswith("category")
     ]
     if cat_candidates:
         cat_col = st.selectbox("Select categorical column", cat_candidates)
-        unique_vals = working_df[cat_col].dropna().astype(str).unique().tolist()
+        cat_values = take_rows(df[cat_col], working_rows)
+        unique_vals, options_truncated = category_options(cat_values)
+        if options_truncated:
+            st.caption(f"Showing the {len(unique_vals):,} most frequent values")
         selected_vals = st.multiselect(
             "Values",
             unique_vals,
             default=unique_vals[:20] if len(unique_vals) > 20 else unique_vals
         )
         if selected_vals:
-            working_df = working_df[working_df[cat_col].astype(str).isin(selected_vals)]
+            working_rows = narrow_rows(working_rows, cat_values.astype(str).isin(selected_vals).to_numpy())
     else:
         st.info("No categorical columns found.")
 
 elif filter_mode == "Numeric range":
-    numeric_df, numeric_cols = safe_numeric_df(working_df)
+    numeric_df, numeric_cols = safe_numeric_df(df)
     if numeric_cols:
         num_col = st.selectbox("Select numeric column", numeric_cols)
-        min_val = float(working_df[num_col].min())
-        max_val = float(working_df[num_col].max())
+        num_values = take_rows(df[num_col], working_rows)
+        min_val = float(num_values.min())
+        max_val = float(num_values.max())
         range_vals = st.slider("Range", min_value=min_val, max_value=max_val, value=(min_val, max_val))
-        working_df = working_df[(working_df[num_col] >= range_vals[0]) & (working_df[num_col] <= range_vals[1])]
+        in_range = (num_values >= range_vals[0]) & (num_values <= range_vals[1])
+        working_rows = narrow_rows(working_rows, in_range.to_numpy(dtype=bool, na_value=False))
     else:
         st.info("No numeric columns found.")
 
-st.write(f"Rows after filters: **{len(working_df):,}**")
+st.write(f"Rows after filters: **{row_count(df, working_rows):,}**")
+
+# The analysis views need a frame, so the selected rows are gathered once.
+working_df = take_rows(df, working_rows)
 
 
 # -----------------------------
@@ -390,29 +880,30 @@ st.write(f"Rows after filters: **{len(working_df):,}**")
 # -----------------------------
 st.subheader("Analysis")
 
+working_key = f"{search_key}:{row_selection_key(working_rows)}"
+working_profile = profile_columns(working_df, working_key, approx_distinct_above, distinct_precision)
+
 tab1, tab2, tab3, tab4, tab5 = st.tabs(
     ["Summary", "Missing data", "Correlations", "Text analysis", "Source analysis"]
 )
 
 with tab1:
-    numeric_df, numeric_cols = safe_numeric_df(working_df)
-    if numeric_cols:
+    numeric_profile = working_profile[working_profile["numeric"]]
+    if not numeric_profile.empty:
         st.markdown("### Numeric summary")
-        st.dataframe(working_df[numeric_cols].describe().T, use_container_width=True)
+        numeric_summary = numeric_profile.set_index("column").reindex(
+            columns=["count", "mean", "std", "min", "25%", "50%", "75%", "max"]
+        )
+        st.dataframe(numeric_summary, use_container_width=True)
     else:
         st.info("No numeric columns available for summary statistics.")
 
     st.markdown("### Top values")
     top_col = st.selectbox("Choose a column for frequency counts", working_df.columns, key="top_col")
-    vc = working_df[top_col].astype(str).value_counts(dropna=False).head(20)
-    st.dataframe(vc.rename_axis("value").reset_index(name="count"), use_container_width=True)
+    st.dataframe(top_k_values(working_df[top_col], 20, dropna=False), use_container_width=True)
 
 with tab2:
-    miss = pd.DataFrame({
-        "column": working_df.columns,
-        "missing_count": [int(working_df[c].isna().sum()) for c in working_df.columns],
-        "missing_pct": [round(working_df[c].isna().mean() * 100, 2) for c in working_df.columns],
-    }).sort_values("missing_count", ascending=False)
+    miss = working_profile[["column", "missing_count", "missing_pct"]].sort_values("missing_count", ascending=False)
 
     st.dataframe(miss, use_container_width=True)
 
@@ -431,17 +922,46 @@ with tab2:
 with tab3:
     numeric_df, numeric_cols = safe_numeric_df(working_df)
     if len(numeric_cols) >= 2:
-        corr = working_df[numeric_cols].corr(numeric_only=True)
-        fig_corr = px.imshow(
-            corr,
-            text_auto=True,
-            aspect="auto",
-            color_continuous_scale="RdBu_r",
-            zmin=-1,
-            zmax=1,
-            title="Correlation matrix"
+        sample_corr = False
+        if len(working_df) > CORR_SAMPLE_ROWS:
+            sample_corr = st.checkbox(f"Estimate from a random sample of {CORR_SAMPLE_ROWS:,} rows")
+        corr, pair_rows = correlation_matrix(
+            working_df, working_key, tuple(numeric_cols), CORR_SAMPLE_ROWS if sample_corr else None
         )
-        st.plotly_chart(fig_corr, use_container_width=True)
+        if sample_corr:
+            st.caption(
+                f"Estimated from {CORR_SAMPLE_ROWS:,} of {len(working_df):,} rows; "
+                "ci_low and ci_high give a 95% confidence interval for each pair"
+            )
+
+        top_pairs = st.number_input("Strongest pairs to list", min_value=1, value=CORR_TOP_PAIRS, step=5)
+        pairs = correlation_pairs(corr, pair_rows, int(top_pairs))
+        st.dataframe(pairs, use_container_width=True)
+
+        if len(numeric_cols) <= CORR_HEATMAP_MAX_COLUMNS:
+            default_heatmap_cols = numeric_cols
+        else:
+            pair_cols = set(pairs["column_a"]) | set(pairs["column_b"])
+            default_heatmap_cols = [col for col in numeric_cols if col in pair_cols][:CORR_HEATMAP_MAX_COLUMNS]
+        heatmap_cols = st.multiselect(
+            "Heatmap columns",
+            numeric_cols,
+            default=default_heatmap_cols,
+            max_selections=CORR_HEATMAP_MAX_COLUMNS
+        )
+        if len(heatmap_cols) >= 2:
+            fig_corr = px.imshow(
+                corr.loc[heatmap_cols, heatmap_cols],
+                text_auto=".2f",
+                aspect="auto",
+                color_continuous_scale="RdBu_r",
+                zmin=-1,
+                zmax=1,
+                title="Correlation matrix"
+            )
+            show_figure(fig_corr)
+        else:
+            st.info("Choose at least two columns for the heatmap.")
     else:
         st.info("Need at least two numeric columns for correlation analysis.")
 
@@ -466,13 +986,9 @@ with tab4:
 
 with tab5:
     if "source_file" in working_df.columns:
-        source_counts = (
-            working_df["source_file"]
-            .astype(str)
-            .value_counts()
-            .rename_axis("source_file")
-            .reset_index(name="row_count")
-        )
+        source_counts = working_df["source_file"].value_counts()
+        source_counts = source_counts[source_counts > 0].rename_axis("source_file").reset_index(name="row_count")
+        source_counts["source_file"] = source_counts["source_file"].astype(str)
         st.dataframe(source_counts, use_container_width=True)
 
         fig_source = px.bar(
@@ -482,6 +998,12 @@ with tab5:
             title="Rows per source file"
         )
         st.plotly_chart(fig_source, use_container_width=True)
+
+        if "data_columns" in row_hashes.columns and len(source_counts) > 1:
+            st.markdown("### Rows shared between files")
+            st.caption("Distinct rows, ignoring source columns, found in both files. The diagonal is each file's distinct row count.")
+            overlap = file_overlap(row_hashes.loc[working_df.index, "data_columns"], working_df["source_file"])
+            st.dataframe(overlap, use_container_width=True)
     else:
         st.info("Source file information is not available.")
 
@@ -506,36 +1028,82 @@ if chart_type in ["Bar", "Line", "Scatter"]:
 
     color_arg = None if color_col == "None" else color_col
 
+    if chart_type in ["Line", "Scatter"]:
+        point_budget = st.number_input(
+            "Point budget",
+            min_value=1_000,
+            value=CHART_POINT_BUDGET,
+            step=1_000,
+            help="Charts with more points than this are reduced on the server before they are drawn."
+        )
+    if chart_type == "Scatter" and len(working_df) > point_budget:
+        scatter_mode = st.radio("Above the budget, draw", ["Density", "Stratified sample"], horizontal=True)
+
+    plot_cols = list(dict.fromkeys([x_col, y_col] + ([color_arg] if color_arg else [])))
     if chart_type == "Bar":
-        fig = px.bar(working_df, x=x_col, y=y_col, color=color_arg, title=f"{chart_type} chart")
+        totals = bar_totals(working_df, working_key, x_col, y_col, color_arg)
+        fig = px.bar(totals, x=x_col, y=totals.columns[-1], color=color_arg, title=f"{chart_type} chart")
     elif chart_type == "Line":
-        fig = px.line(working_df, x=x_col, y=y_col, color=color_arg, title=f"{chart_type} chart")
+        plot_df = working_df
+        if len(working_df) > point_budget:
+            line_rows, reduction = lttb_rows(working_df, x_col, y_col, color_arg, point_budget)
+            plot_df = working_df[plot_cols].iloc[line_rows]
+            st.caption(f"Reduced data: {len(plot_df):,} of {len(working_df):,} points, {reduction}")
+        fig = px.line(plot_df, x=x_col, y=y_col, color=color_arg, title=f"{chart_type} chart")
     else:
-        fig = px.scatter(working_df, x=x_col, y=y_col, color=color_arg, title=f"{chart_type} chart")
-
-    st.plotly_chart(fig, use_container_width=True)
+        fig = None
+        if len(working_df) > point_budget and scatter_mode == "Density":
+            fig = density_figure(working_df, x_col, y_col, f"{chart_type} chart (density)")
+            if fig is not None:
+                st.caption(
+                    f"Reduced data: {len(working_df):,} points binned into a "
+                    f"{DENSITY_BINS}x{DENSITY_BINS} density grid; color groups are not shown"
+                )
+        if fig is None:
+            plot_df = working_df
+            if len(working_df) > point_budget:
+                plot_df = working_df[plot_cols].iloc[stratified_sample_rows(working_df, color_arg, point_budget)]
+                st.caption(
+                    f"Reduced data: a random sample of {len(plot_df):,} of {len(working_df):,} points, "
+                    "stratified by color group"
+                )
+            fig = px.scatter(plot_df, x=x_col, y=y_col, color=color_arg, title=f"{chart_type} chart")
+
+    show_figure(fig)
 
 elif chart_type == "Histogram":
     hist_col = st.selectbox("Column", numeric_cols if numeric_cols else all_cols, key="hist_col")
     bins = st.slider("Bins", 5, 100, 20)
-    fig = px.histogram(working_df, x=hist_col, nbins=bins, title="Histogram")
-    st.plotly_chart(fig, use_container_width=True)
+    fig = histogram_figure(histogram_bins(working_df, working_key, hist_col, bins), hist_col, "Histogram")
+    show_figure(fig)
 
 elif chart_type == "Box":
     y_col = st.selectbox("Numeric column", numeric_cols if numeric_cols else all_cols, key="box_y")
     x_group = st.selectbox("Group by (optional)", ["None"] + all_cols, key="box_x")
-    if x_group == "None":
-        fig = px.box(working_df, y=y_col, title="Box plot")
+    group_col = None if x_group == "None" else x_group
+    box_stats, n_groups = box_statistics(working_df, working_key, y_col, group_col)
+    if box_stats is None:
+        st.info("Box plots need a numeric or datetime column.")
     else:
-        fig = px.box(working_df, x=x_group, y=y_col, title="Box plot")
-    st.plotly_chart(fig, use_container_width=True)
+        show_figure(box_figure(box_stats, y_col, group_col, "Box plot"))
+        note = (
+            f"Whiskers reach the furthest values within 1.5 IQR; "
+            f"{int(box_stats['outliers'].sum()):,} outliers beyond them are not drawn"
+        )
+        if n_groups > len(box_stats):
+            note += f". Showing the {len(box_stats)} largest of {n_groups:,} groups"
+        st.caption(note)
 
 elif chart_type == "Pie":
     pie_col = st.selectbox("Category column", all_cols, key="pie_col")
-    pie_counts = working_df[pie_col].astype(str).value_counts().reset_index()
+    pie_counts = top_k_values(working_df[pie_col], PIE_MAX_SLICES)
+    other_count = int(working_df[pie_col].notna().sum()) - int(pie_counts["count"].sum())
+    if other_count > 0:
+        pie_counts.loc[len(pie_counts)] = ["Other", other_count]
+    pie_counts["value"] = pie_counts["value"].astype(str)
     pie_counts.columns = [pie_col, "count"]
     fig = px.pie(pie_counts, names=pie_col, values="count", title="Pie chart")
-    st.plotly_chart(fig, use_container_width=True)
+    show_figure(fig)
 
 
 # -----------------------------
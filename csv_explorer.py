@@ -0,0 +1,2030 @@
+"""Helpers shared by CSV-Analyzer.py and CSV-Combinator.py."""
+import io
+import os
+import re
+import csv
+import json
+import time
+import codecs
+import hashlib
+import tempfile
+import threading
+import uuid
+import zipfile
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+import pyarrow as pa
+import pyarrow.acero as ac
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+import streamlit as st
+import plotly.express as px
+import plotly.graph_objects as go
+
+
+PARSE_CACHE_DIR = Path(os.environ.get("CSV_EXPLORER_CACHE_DIR", Path(tempfile.gettempdir()) / "csv_explorer_cache"))
+PARSE_CACHE_MAX_BYTES = int(os.environ.get("CSV_EXPLORER_CACHE_MB", "4096")) * 1_000_000
+PARSE_CACHE_VERSION = "1"
+
+
+def upload_fingerprint(uploaded_file) -> str:
+    # Hash each upload once per session; reruns reuse the digest instead of
+    # letting st.cache_data rehash the full bytes every time.
+    fingerprints = st.session_state.setdefault("upload_fingerprints", {})
+    if uploaded_file.file_id not in fingerprints:
+        digest = hashlib.blake2b(uploaded_file.getvalue(), digest_size=16)
+        fingerprints[uploaded_file.file_id] = f"{uploaded_file.size:x}-{digest.hexdigest()}"
+    return fingerprints[uploaded_file.file_id]
+
+
+UPLOAD_TYPES = ["csv", "gz", "bz2", "zst", "zip"]
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".bz2": "bz2", ".zst": "zstd"}
+
+
+SIZE_PROBE_BYTES = 8 * 1024 * 1024
+
+
+@st.cache_data(show_spinner=False)
+def inflated_size(_data: bytes, fingerprint: str, compression: str):
+    # Returns (bytes, estimated) for a gzip/bz2/zstd upload. Up to
+    # SIZE_PROBE_BYTES are decompressed; a longer stream is assumed to keep
+    # the compression ratio of that head. The gzip size trailer is not used:
+    # it wraps at 4 GB and only describes the last member.
+    raw = pa.BufferReader(_data)
+    try:
+        with pa.CompressedInputStream(raw, compression) as stream:
+            inflated = len(stream.read(SIZE_PROBE_BYTES))
+            if not stream.read(1):
+                return inflated, False
+            consumed = raw.tell()
+    except (OSError, ValueError):
+        # Corrupt streams fail again, with a proper message, when parsed.
+        return len(_data), True
+    return int(len(_data) * inflated / max(consumed, 1)), True
+
+
+class CsvSource:
+    # One CSV to parse: an upload, possibly gzip/bz2/zstd compressed, or one
+    # member of an uploaded zip archive. open() returns a stream that
+    # decompresses as the parser reads it, so the inflated CSV is never held
+    # in memory whole. size is the inflated CSV size in bytes (estimated for
+    # gzip/bz2/zstd when size_estimated is set); compressed_size is the
+    # number of uploaded bytes it came from, or None for a plain CSV.
+    def __init__(self, data: bytes, name: str, fingerprint: str, size: int, compression=None, member=None,
+                 compressed_size=None, size_estimated: bool = False):
+        self.data = data
+        self.name = name
+        self.fingerprint = fingerprint
+        self.size = size
+        self.compression = compression
+        self.member = member
+        self.compressed_size = compressed_size
+        self.size_estimated = size_estimated
+
+    def open(self):
+        if self.member is not None:
+            return zipfile.ZipFile(io.BytesIO(self.data)).open(self.member)
+        if self.compression is not None:
+            return pa.CompressedInputStream(pa.BufferReader(self.data), self.compression)
+        return io.BytesIO(self.data)
+
+    def head(self, n_bytes: int) -> bytes:
+        with self.open() as stream:
+            return stream.read(n_bytes)
+
+
+def upload_sources(uploaded_file) -> list:
+    # Zip archives contribute one source per CSV member.
+    data = uploaded_file.getvalue()
+    fingerprint = upload_fingerprint(uploaded_file)
+    suffix = Path(uploaded_file.name.lower()).suffix
+    if suffix == ".zip":
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            members = [
+                info for info in archive.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(".csv")
+                and not info.filename.startswith("__MACOSX/")
+            ]
+        return [
+            CsvSource(data, f"{uploaded_file.name}/{info.filename}", f"{fingerprint}/{info.filename}",
+                      info.file_size, member=info.filename, compressed_size=info.compress_size)
+            for info in members
+        ]
+    compression = COMPRESSION_SUFFIXES.get(suffix)
+    if compression is None:
+        return [CsvSource(data, uploaded_file.name, fingerprint, len(data))]
+    size, estimated = inflated_size(data, fingerprint, compression)
+    return [CsvSource(data, uploaded_file.name, fingerprint, size, compression=compression,
+                      compressed_size=len(data), size_estimated=estimated)]
+
+
+def parse_cache_path(fingerprint: str, **options) -> Path:
+    key = json.dumps({"v": PARSE_CACHE_VERSION, "fingerprint": fingerprint, **options}, sort_keys=True)
+    return PARSE_CACHE_DIR / f"{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}.arrow"
+
+
+def read_parse_cache(path: Path):
+    # Uncompressed Arrow IPC files are memory-mapped, so a cache hit pages
+    # columns in lazily instead of copying them.
+    try:
+        table = feather.read_table(path, memory_map=True)
+        os.utime(path)
+    except (FileNotFoundError, pa.ArrowInvalid, OSError):
+        return None, None
+    meta = json.loads((table.schema.metadata or {}).get(b"csv_explorer", b"{}"))
+    return table.to_pandas(types_mapper=pd.ArrowDtype), meta
+
+
+def write_parse_cache(path: Path, df: pd.DataFrame, meta: dict):
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if table.nbytes > PARSE_CACHE_MAX_BYTES:
+            return
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            b"csv_explorer": json.dumps(meta).encode(),
+        })
+        PARSE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+    except (pa.ArrowException, OSError, TypeError, ValueError):
+        return
+    evict_parse_cache(PARSE_CACHE_MAX_BYTES, keep=path)
+
+
+def evict_parse_cache(max_bytes: int, keep=None, directory: Path = PARSE_CACHE_DIR):
+    # LRU by mtime: hits touch their file, so the oldest files go first. The
+    # entry just written is kept, and so is anything touched within the
+    # dataset idle window, since a session may still be mapping it.
+    pinned_after = time.time() - DATASET_IDLE_SECONDS
+    entries = []
+    for entry in directory.glob("*"):
+        if entry.suffix not in (".arrow", ".parquet"):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry))
+    total = sum(size for _, size, _ in entries)
+    for mtime, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        if entry == keep or mtime > pinned_after:
+            continue
+        try:
+            entry.unlink(missing_ok=True)
+        except OSError:
+            continue
+        total -= size
+
+
+PROFILE_SAMPLE_BYTES = 64 * 1024
+AUTO_ENCODINGS = ["utf-8", "cp1256", "latin1"]
+
+
+def looks_numeric(value: str) -> bool:
+    try:
+        float(value.replace(",", ""))
+        return True
+    except ValueError:
+        return False
+
+
+def profile_csv_bytes(file_bytes: bytes, encoding_choice: str, separator_mode: str) -> dict:
+    # One pass over a bounded sample: encoding/BOM, delimiter, quoting and
+    # the header row, so the full file only has to be parsed once.
+    sample = file_bytes[:PROFILE_SAMPLE_BYTES]
+    is_partial = len(file_bytes) > len(sample)
+    has_bom = sample.startswith(codecs.BOM_UTF8)
+
+    if encoding_choice != "Auto try common encodings":
+        encoding = encoding_choice
+        text = codecs.getincrementaldecoder(encoding)(errors="replace").decode(sample, final=not is_partial)
+    elif has_bom:
+        encoding = "utf-8-sig"
+        text = codecs.getincrementaldecoder(encoding)(errors="replace").decode(sample, final=not is_partial)
+    else:
+        encoding, text = None, ""
+        for enc in AUTO_ENCODINGS:
+            try:
+                text = codecs.getincrementaldecoder(enc)().decode(sample, final=not is_partial)
+                encoding = enc
+                break
+            except UnicodeDecodeError:
+                continue
+
+    lines = text.splitlines()
+    if is_partial and lines:
+        lines = lines[:-1]
+    sniff_text = "\n".join(lines[:50])
+
+    delimiters = [",", ";", "\t", "|"] if separator_mode == "Auto detect" else [separator_mode]
+    sniffer = csv.Sniffer()
+    try:
+        dialect = sniffer.sniff(sniff_text, delimiters=delimiters)
+        delimiter, quotechar = dialect.delimiter, dialect.quotechar or '"'
+    except Exception:
+        delimiter, quotechar = delimiters[0], '"'
+
+    # Skip preamble lines (titles, export banners) above the real header:
+    # the header is the first row with the most common field count.
+    rows = list(csv.reader(lines[:50], delimiter=delimiter, quotechar=quotechar))
+    field_counts = [len(row) for row in rows if row]
+    header_row = 0
+    if field_counts:
+        modal_count = max(set(field_counts), key=field_counts.count)
+        header_row = next(i for i, row in enumerate(rows) if len(row) == modal_count)
+
+    # Column names are rarely numbers, so only treat the file as headerless
+    # when the sniffer agrees and the first row actually looks like data.
+    has_header = True
+    if rows[header_row:]:
+        try:
+            sniffed_header = sniffer.has_header("\n".join(lines[header_row:header_row + 50]))
+        except Exception:
+            sniffed_header = True
+        if not sniffed_header and any(looks_numeric(v) for v in rows[header_row]):
+            has_header = False
+
+    return {
+        "encoding": encoding or "latin1",
+        "bom": has_bom,
+        "separator": delimiter,
+        "quotechar": quotechar,
+        "header_row": header_row if has_header else None,
+        "skip_rows": header_row,
+    }
+
+
+def read_csv_fast(source: CsvSource, **read_kwargs):
+    # pyarrow parses blocks on all cores; fall back to the C engine for
+    # files or options pyarrow rejects. Both paths return Arrow-backed dtypes.
+    start = time.perf_counter()
+    try:
+        with source.open() as stream:
+            df = pd.read_csv(stream, engine="pyarrow", dtype_backend="pyarrow", **read_kwargs)
+        # pyarrow keeps undecodable text as binary instead of raising
+        if any(isinstance(dt, pd.ArrowDtype) and pa.types.is_binary(dt.pyarrow_dtype) for dt in df.dtypes):
+            raise ValueError("pyarrow could not decode all text columns")
+        engine = "pyarrow"
+    except Exception:
+        with source.open() as stream:
+            df = pd.read_csv(stream, dtype_backend="pyarrow", **read_kwargs)
+        engine = "c"
+    seconds = max(time.perf_counter() - start, 1e-9)
+    size_mb = source.size / 1_000_000
+    stats = {
+        "engine": engine,
+        "size_mb": round(size_mb, 2),
+        "seconds": round(seconds, 3),
+        "mb_per_s": round(size_mb / seconds, 1),
+    }
+    return df, stats
+
+
+DEDUP_SPILL_HASHES = int(os.environ.get("CSV_EXPLORER_DEDUP_HASHES", "10000000"))
+NULL_HASH = np.uint64(0x9E3779B97F4A7C15)
+
+
+def canonical_row_hashes(df: pd.DataFrame, columns, constants=None) -> np.ndarray:
+    # Row hashes that agree across files whose columns were parsed with
+    # different dtypes or are missing: numbers hash as float64, other
+    # values by their string form, and every null hashes alike. Columns in
+    # constants hold one value for the whole frame (source provenance).
+    constants = constants or {}
+    hashes = np.zeros(len(df), dtype=np.uint64)
+    for col in columns:
+        if col in constants:
+            value_hash = pd.util.hash_array(np.array([str(constants[col])], dtype=object))[0]
+            col_hashes = np.full(len(df), value_hash, dtype=np.uint64)
+        elif col in df.columns:
+            series = df[col]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                # Hash each category once and gather by code.
+                category_hashes = pd.util.hash_array(series.cat.categories.astype(str).to_numpy(dtype=object))
+                codes = series.cat.codes.to_numpy()
+                col_hashes = np.append(category_hashes, NULL_HASH)[codes]
+            else:
+                if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                    values = series.to_numpy(dtype="float64", na_value=np.nan)
+                else:
+                    values = series.astype(str).to_numpy(dtype=object, na_value="")
+                col_hashes = pd.util.hash_array(values)
+                col_hashes[series.isna().to_numpy()] = NULL_HASH
+        else:
+            col_hashes = np.full(len(df), NULL_HASH, dtype=np.uint64)
+        hashes = hashes * np.uint64(1_000_003) ^ col_hashes
+    return hashes
+
+
+class SeenHashes:
+    # Row hashes seen so far, as a sorted in-memory array that is written
+    # out as a sorted run once it holds max_in_memory hashes. Lookups
+    # binary-search the array and every memory-mapped run.
+    def __init__(self, max_in_memory: int, spill_dir: str):
+        self.max_in_memory = max_in_memory
+        self.spill_dir = spill_dir
+        self.memory = np.empty(0, dtype=np.uint64)
+        self.runs = []
+
+    @staticmethod
+    def member(sorted_hashes, hashes):
+        if not len(sorted_hashes):
+            return np.zeros(len(hashes), dtype=bool)
+        pos = np.minimum(np.searchsorted(sorted_hashes, hashes), len(sorted_hashes) - 1)
+        return sorted_hashes[pos] == hashes
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        found = self.member(self.memory, hashes)
+        for run in self.runs:
+            found |= self.member(run, hashes)
+        return found
+
+    def add(self, hashes: np.ndarray):
+        self.memory = np.union1d(self.memory, hashes)
+        if len(self.memory) >= self.max_in_memory:
+            path = os.path.join(self.spill_dir, f"run-{len(self.runs)}.npy")
+            np.save(path, self.memory)
+            self.runs.append(np.load(path, mmap_mode="r"))
+            self.memory = np.empty(0, dtype=np.uint64)
+
+
+def combined_columns(column_lists, join_type: str):
+    columns = list(column_lists[0])
+    for part_columns in column_lists[1:]:
+        if join_type == "outer":
+            columns += [c for c in part_columns if c not in columns]
+        else:
+            columns = [c for c in columns if c in part_columns]
+    return columns
+
+
+def stream_dedup(dfs, columns, constants, seen_parts=()):
+    # Keeps the first occurrence of every row, file by file in upload order,
+    # replacing each parsed part with its surviving rows so the raw
+    # concatenation is never built. seen_parts are (frame, constants) pairs
+    # already kept by an earlier run. Returns duplicates removed per part.
+    removed = []
+    with tempfile.TemporaryDirectory(prefix="csv_dedup_") as spill_dir:
+        seen = SeenHashes(DEDUP_SPILL_HASHES, spill_dir)
+        for df_part, part_constants in seen_parts:
+            seen.add(canonical_row_hashes(df_part, columns, part_constants))
+        for i, (df_part, part_constants) in enumerate(zip(dfs, constants)):
+            hashes = canonical_row_hashes(df_part, columns, part_constants)
+            keep = ~pd.Series(hashes).duplicated().to_numpy() & ~seen.contains(hashes)
+            seen.add(hashes[keep])
+            removed.append(int(len(df_part) - keep.sum()))
+            dfs[i] = df_part[keep]
+        seen.runs.clear()
+    return removed
+
+
+PLAN_SAMPLE_ROWS = 1_000
+
+
+def sampled_kind(series: pd.Series) -> str:
+    if series.isna().all():
+        return "null"
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_integer_dtype(series):
+        return "int"
+    if pd.api.types.is_float_dtype(series):
+        return "float"
+    if is_text_dtype(series):
+        return "string"
+    return "other"
+
+
+def unified_arrow_type(kinds):
+    # Arrow type alias every file can be parsed into, or None to let each
+    # file infer its own type.
+    kinds = set(kinds) - {"null"}
+    if not kinds or "other" in kinds:
+        return None
+    if kinds == {"int"}:
+        return "int64"
+    if kinds <= {"int", "float"}:
+        return "double"
+    if kinds == {"bool"}:
+        return "bool"
+    return "string"
+
+
+def sample_csv_columns(source: CsvSource, encoding_choice: str, separator_mode: str) -> dict:
+    # Header and first rows only, read with the same profile as the full parse.
+    profile = profile_csv_bytes(source.head(PROFILE_SAMPLE_BYTES + 1), encoding_choice, separator_mode)
+    with source.open() as stream:
+        sample = pd.read_csv(
+            stream,
+            sep=profile["separator"],
+            quotechar=profile["quotechar"],
+            header=0 if profile["header_row"] is not None else None,
+            skiprows=profile["skip_rows"] or None,
+            encoding=profile["encoding"],
+            nrows=PLAN_SAMPLE_ROWS,
+            dtype_backend="pyarrow"
+        )
+    if profile["header_row"] is None:
+        sample.columns = [f"column_{i + 1}" for i in range(len(sample.columns))]
+    return {
+        "headerless": profile["header_row"] is None,
+        "kinds": {col: sampled_kind(sample[col]) for col in sample.columns},
+    }
+
+
+@st.cache_data(show_spinner="Planning the combined schema...")
+def plan_combined_schema(_sources, fingerprints, encoding_choice, separator_mode, combine_mode):
+    # Reads only headers and sampled rows, then fixes the combined columns
+    # and one dtype per column for apply_schema_plan to cast every file to.
+    samples = []
+    for source in _sources:
+        try:
+            samples.append(sample_csv_columns(source, encoding_choice, separator_mode))
+        except Exception:
+            samples.append(None)
+    sampled = [sample for sample in samples if sample is not None]
+    if not sampled:
+        return [None] * len(samples), pd.DataFrame(columns=["column", "planned_dtype", "files"])
+
+    join_type = "outer" if combine_mode == "Append rows (keep all columns)" else "inner"
+    columns = combined_columns([list(sample["kinds"]) for sample in sampled], join_type)
+    types = {
+        col: unified_arrow_type(sample["kinds"][col] for sample in sampled if col in sample["kinds"])
+        for col in columns
+    }
+
+    plans = []
+    for sample in samples:
+        if sample is None:
+            plans.append(None)
+            continue
+        file_columns = list(sample["kinds"])
+        usecols = [col for col in file_columns if col in types] if join_type == "inner" else None
+        plans.append({
+            # Reading no columns would also drop every row, so an empty
+            # shared set is left to the inner concat.
+            "usecols": usecols if usecols and usecols != file_columns else None,
+            "dtype": {col: types[col] for col in file_columns if types.get(col)},
+        })
+
+    schema = pd.DataFrame({
+        "column": columns,
+        "planned_dtype": [types[col] or "inferred per file" for col in columns],
+        "files": [sum(col in sample["kinds"] for sample in sampled) for col in columns],
+    })
+    return plans, schema
+
+
+def apply_schema_plan(df: pd.DataFrame, plan):
+    # Projects a block parsed with its own inferred dtypes onto its planned
+    # columns and casts them to the planned dtypes. Blocks are cached as
+    # parsed, so a plan that changes when files are added or removed costs a
+    # cast instead of a re-parse. A column whose values do not fit its
+    # planned dtype (the plan only sampled the head of each file) keeps its
+    # parsed dtype. Returns (frame, whether every planned cast held).
+    if plan is None:
+        return df, False
+    if plan["usecols"] is not None:
+        df = df[[col for col in df.columns if col in plan["usecols"]]]
+    casts = {}
+    held = True
+    for col, alias in plan["dtype"].items():
+        dtype = pd.ArrowDtype(pa.type_for_alias(alias))
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        try:
+            casts[col] = df[col].astype(dtype)
+        except (pa.ArrowException, TypeError, ValueError):
+            held = False
+    if casts:
+        df = df.assign(**casts)
+    return df, held
+
+
+DATASET_IDLE_SECONDS = int(os.environ.get("CSV_EXPLORER_DATASET_IDLE_SECONDS", "1800"))
+ADMIN_TOKEN = os.environ.get("CSV_EXPLORER_ADMIN_TOKEN")
+
+
+class DatasetRegistry:
+    # Process-wide store with one copy of each loaded dataset, keyed by
+    # content fingerprint and load options. Each session's reference is the
+    # key it last viewed. A dataset is evicted as soon as the last session
+    # viewing it moves to another key; references from sessions that have
+    # not rerun for idle_seconds lapse, and datasets without references are
+    # evicted once idle as long. Sessions share the frame itself:
+    # copy-on-write keeps their own column changes out of the shared copy.
+    def __init__(self, idle_seconds: int):
+        self.idle_seconds = idle_seconds
+        self.lock = threading.Lock()
+        self.datasets = {}
+        self.sessions = {}
+
+    def references(self, now: float) -> dict:
+        counts = {}
+        for key, seen in self.sessions.values():
+            if now - seen <= self.idle_seconds:
+                counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def evict_idle(self, now: float):
+        self.sessions = {
+            session: (key, seen) for session, (key, seen) in self.sessions.items()
+            if now - seen <= self.idle_seconds
+        }
+        counts = self.references(now)
+        for key in [key for key, dataset in self.datasets.items()
+                    if not counts.get(key) and now - dataset["last_used"] > self.idle_seconds]:
+            del self.datasets[key]
+
+    def current(self, session: str):
+        # The dataset the session referenced on its last run, if resident.
+        with self.lock:
+            key, _ = self.sessions.get(session, (None, None))
+            return self.datasets.get(key)
+
+    def acquire(self, key: str, session: str):
+        # Moves the session's reference to key; returns the resident dataset
+        # or None when the caller has to load it and put() it.
+        now = time.time()
+        with self.lock:
+            released, _ = self.sessions.get(session, (None, None))
+            self.sessions[session] = (key, now)
+            if released not in (None, key) and not self.references(now).get(released):
+                self.datasets.pop(released, None)
+            self.evict_idle(now)
+            dataset = self.datasets.get(key)
+            if dataset is not None:
+                dataset["last_used"] = now
+            return dataset
+
+    def put(self, key: str, df: pd.DataFrame, **meta) -> dict:
+        now = time.time()
+        with self.lock:
+            # Another session may have finished loading the same data first.
+            dataset = self.datasets.get(key)
+            if dataset is None:
+                dataset = {
+                    "df": df,
+                    "memory_mb": df.memory_usage(deep=True).sum() / 1_000_000,
+                    "loaded": now,
+                    **meta,
+                }
+                self.datasets[key] = dataset
+            dataset["last_used"] = now
+            return dataset
+
+    def summary(self) -> pd.DataFrame:
+        now = time.time()
+        with self.lock:
+            self.evict_idle(now)
+            counts = self.references(now)
+            rows = [
+                {
+                    "dataset": dataset["name"],
+                    "rows": len(dataset["df"]),
+                    "columns": dataset["df"].shape[1],
+                    "memory_mb": round(dataset["memory_mb"], 1),
+                    "sessions": counts.get(key, 0),
+                    "idle_seconds": int(now - dataset["last_used"]),
+                }
+                for key, dataset in self.datasets.items()
+            ]
+        return pd.DataFrame(rows, columns=["dataset", "rows", "columns", "memory_mb", "sessions", "idle_seconds"])
+
+
+@st.cache_resource
+def dataset_registry() -> DatasetRegistry:
+    return DatasetRegistry(DATASET_IDLE_SECONDS)
+
+
+def session_token() -> str:
+    return st.session_state.setdefault("session_token", uuid.uuid4().hex)
+
+
+def build_search_series(df: pd.DataFrame) -> pd.Series:
+    return df.astype(str).fillna("").agg(" | ".join, axis=1)
+
+
+def scan_search_mask(df: pd.DataFrame, search_text: str, case_sensitive: bool, use_regex: bool) -> np.ndarray:
+    search_series = build_search_series(df)
+    if use_regex:
+        flags = 0 if case_sensitive else re.IGNORECASE
+        mask = search_series.str.contains(search_text, regex=True, na=False, flags=flags)
+    else:
+        needle = search_text if case_sensitive else search_text.lower()
+        haystack = search_series if case_sensitive else search_series.str.lower()
+        mask = haystack.str.contains(re.escape(needle), regex=True, na=False)
+    return mask.to_numpy(dtype=bool)
+
+
+def trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def required_literals(pattern: str):
+    # Runs of plain characters at the top level of a regex must appear in
+    # every match, so their trigrams can prune candidates before verifying.
+    # The parser is private to the re module, so any change in its shape
+    # returns None and the caller falls back to a scan.
+    literals, run = [], []
+    try:
+        for op, arg in re._parser.parse(pattern):
+            if op is re._constants.LITERAL:
+                run.append(chr(arg))
+            else:
+                literals.append("".join(run))
+                run = []
+    except (AttributeError, TypeError, ValueError, re.error):
+        return None
+    literals.append("".join(run))
+    return [lit for lit in literals if len(lit) >= 3]
+
+
+class TrigramIndex:
+    # Per column: factorized codes for every row, the distinct values as
+    # strings, and trigram -> distinct-value posting lists. Queries intersect
+    # posting lists, verify only the candidate values, then map them back to
+    # rows through the codes.
+    def __init__(self, df: pd.DataFrame):
+        self.n_rows = len(df)
+        self.columns = []
+        for col in df.columns:
+            codes, uniques = pd.factorize(df[col], use_na_sentinel=True)
+            values = pd.Index(uniques).astype(str).tolist()
+            lowered = [value.lower() for value in values]
+            postings = {}
+            for value_id, value in enumerate(lowered):
+                for gram in trigrams(value):
+                    postings.setdefault(gram, []).append(value_id)
+            postings = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in postings.items()}
+            self.columns.append((codes.astype(np.int32), np.asarray(values, dtype=object),
+                                 np.asarray(lowered, dtype=object), postings))
+
+    def candidates(self, postings, grams):
+        lists = sorted((postings.get(gram) for gram in grams), key=lambda ids: -1 if ids is None else len(ids))
+        if lists[0] is None:
+            return np.empty(0, dtype=np.int32)
+        result = lists[0]
+        for ids in lists[1:]:
+            result = np.intersect1d(result, ids, assume_unique=True)
+            if not len(result):
+                break
+        return result
+
+    def rows_with_grams(self, grams) -> np.ndarray:
+        rows = np.ones(self.n_rows, dtype=bool)
+        for gram in grams:
+            gram_rows = np.zeros(self.n_rows, dtype=bool)
+            for codes, values, lowered, postings in self.columns:
+                ids = postings.get(gram)
+                if ids is not None:
+                    gram_rows |= np.isin(codes, ids)
+            rows &= gram_rows
+        return rows
+
+    def search(self, df: pd.DataFrame, search_text: str, case_sensitive: bool, use_regex: bool):
+        # Returns (row mask, candidates verified), or None when the index
+        # cannot narrow the query and callers should fall back to a scan.
+        # Cells are joined with " | " for the scan, so a regex is verified on
+        # the joined rows of the candidates, and a plain needle that could
+        # straddle a separator is left to the scan.
+        if use_regex:
+            literals = required_literals(search_text)
+            if literals is None:
+                return None
+            pieces = [
+                piece.lower()
+                for literal in literals
+                for piece in re.split(r"[\s|]+", literal)
+            ]
+            grams = set().union(*(trigrams(piece) for piece in pieces))
+            if not grams:
+                return None
+            rows = np.flatnonzero(self.rows_with_grams(grams))
+            mask = np.zeros(self.n_rows, dtype=bool)
+            if len(rows):
+                mask[rows] = scan_search_mask(df.iloc[rows], search_text, case_sensitive, True)
+            return mask, len(rows)
+
+        needle = search_text if case_sensitive else search_text.lower()
+        if len(needle) < 3 or "|" in needle or needle != needle.strip(" "):
+            return None
+        grams = trigrams(search_text.lower())
+
+        mask = np.zeros(self.n_rows, dtype=bool)
+        verified = 0
+        for codes, values, lowered, postings in self.columns:
+            cand = self.candidates(postings, grams)
+            if not len(cand):
+                continue
+            verified += len(cand)
+            haystack = values if case_sensitive else lowered
+            hits = [value_id for value_id in cand if needle in haystack[value_id]]
+            if hits:
+                mask |= np.isin(codes, hits)
+        return mask, verified
+
+
+@st.cache_resource(max_entries=8, show_spinner="Building search index...")
+def build_trigram_index(_df: pd.DataFrame, search_key: str) -> TrigramIndex:
+    return TrigramIndex(_df)
+
+
+def rendered_chars(series: pd.Series):
+    # Characters that str() of a non-text column can produce, lowercased;
+    # None when the column may render arbitrary text.
+    if pd.api.types.is_bool_dtype(series):
+        return set("truefals")
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_complex_dtype(series):
+        return set("0123456789.-+einfa")
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return set("0123456789-:. +t")
+    return None
+
+
+REGEX_QUANTIFIER = re.compile(r"(?:[*+?]|\{\d+(?:,\d*)?\})\??")
+
+
+def regex_stays_in_cell(pattern: str) -> bool:
+    # True when the regex matches a joined " | " row exactly when it matches
+    # one of its cells, and RE2 agrees with Python on it: literals, escaped
+    # punctuation, character classes, groups, alternation and quantifiers
+    # that can neither match " " or "|" nor match the empty string.
+    # Anything else (".", anchors, lookarounds, backreferences, inline
+    # flags, and \d \w \s \b, which are ASCII-only in RE2) is refused.
+    try:
+        if re.compile(pattern).search("") is not None:
+            return False
+    except re.error:
+        return False
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            escaped = pattern[i + 1]
+            if escaped in " |" or (escaped.isalnum() and escaped not in "tnrfv"):
+                return False
+            i += 2
+        elif char == "[":
+            end = i + 1
+            if pattern[end] == "^":
+                return False
+            if pattern[end] == "]":
+                end += 1
+            while pattern[end] != "]":
+                if pattern[end] == "[":
+                    return False
+                if pattern[end] == "\\":
+                    if pattern[end + 1].isalnum() and pattern[end + 1] not in "tnrfv":
+                        return False
+                    end += 1
+                end += 1
+            member = re.compile(pattern[i:end + 1], re.IGNORECASE)
+            if member.match(" ") or member.match("|"):
+                return False
+            i = end + 1
+        elif char == "(":
+            if pattern.startswith("(?P<", i):
+                i = pattern.index(">", i) + 1
+            elif pattern.startswith("(?:", i):
+                i += 3
+            elif pattern.startswith("(?", i):
+                return False
+            else:
+                i += 1
+        elif char in "*+?{":
+            quantifier = REGEX_QUANTIFIER.match(pattern, i)
+            # Possessive quantifiers are Python-only.
+            if quantifier is None or pattern[quantifier.end():quantifier.end() + 1] == "+":
+                return False
+            i = quantifier.end()
+        elif char in ".^$ ":
+            return False
+        else:
+            i += 1
+    return True
+
+
+def arrow_search_mask(df: pd.DataFrame, search_text: str, case_sensitive: bool, use_regex: bool):
+    # Matches each column with Arrow compute kernels and ORs the masks, so
+    # no per-row string is built. Returns (row mask, columns scanned), or
+    # None when the query needs the joined-row scan: a plain needle that
+    # could straddle the " | " separator, a regex that could span cells or
+    # differ between RE2 and Python (see regex_stays_in_cell), or a query
+    # RE2 cannot run.
+    if use_regex:
+        if not regex_stays_in_cell(search_text):
+            return None
+    elif "|" in search_text or search_text != search_text.strip(" "):
+        return None
+
+    needle_chars = set(search_text.lower())
+    mask = np.zeros(len(df), dtype=bool)
+    scanned = 0
+    for col in df.columns:
+        series = df[col]
+        if not is_text_dtype(series):
+            chars = rendered_chars(series)
+            if not use_regex and chars is not None and not needle_chars <= chars:
+                continue
+            series = series.astype(str)
+        elif series.dtype == "object":
+            series = series.astype(str)
+
+        values = pa.array(series, from_pandas=True)
+        if pa.types.is_dictionary(values.type):
+            indices, values = values.indices, values.dictionary
+        else:
+            indices = None
+        try:
+            if use_regex:
+                hits = pc.match_substring_regex(values, search_text, ignore_case=not case_sensitive)
+            else:
+                hits = pc.match_substring(values, search_text, ignore_case=not case_sensitive)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            return None
+        if indices is not None:
+            hits = pc.take(hits, indices)
+        mask |= pc.fill_null(hits, False).to_numpy(zero_copy_only=False)
+        scanned += 1
+    return mask, scanned
+
+
+def narrows_search(previous: dict, search_text: str, case_sensitive: bool, use_regex: bool) -> bool:
+    # True when every row matching the new query must have matched the
+    # previous one, so only the previous matches need to be searched.
+    if previous["use_regex"] or use_regex:
+        return (
+            previous["use_regex"] and use_regex and previous["text"] == search_text
+            and (case_sensitive or not previous["case_sensitive"])
+        )
+    if previous["case_sensitive"]:
+        return case_sensitive and previous["text"] in search_text
+    return previous["text"].lower() in search_text.lower()
+
+
+def refine_search_mask(df: pd.DataFrame, rows: np.ndarray, search_text: str, case_sensitive: bool,
+                       use_regex: bool, search_engine: str) -> np.ndarray:
+    mask = np.zeros(len(df), dtype=bool)
+    if not len(rows):
+        return mask
+    subset = df.iloc[rows]
+    result = None
+    if search_engine == "Column-wise (Arrow)":
+        result = arrow_search_mask(subset, search_text, case_sensitive, use_regex)
+    if result is None:
+        mask[rows] = scan_search_mask(subset, search_text, case_sensitive, use_regex)
+    else:
+        mask[rows] = result[0]
+    return mask
+
+
+DATETIME_SAMPLE_ROWS = 200
+
+
+def infer_datetime_format(values: pd.Series):
+    # Candidate formats are guessed from every sampled value, month-first
+    # and day-first; the one that parses the most values wins.
+    candidates = pd.Series(
+        [guess_datetime_format(value) for value in values]
+        + [guess_datetime_format(value, dayfirst=True) for value in values]
+    ).value_counts()
+    best_format, best_share = None, 0.0
+    for fmt in candidates.index[:4]:
+        share = pd.to_datetime(values, format=fmt, errors="coerce", utc=True).notna().mean()
+        if share > best_share:
+            best_format, best_share = fmt, share
+    return best_format, best_share
+
+
+def is_arrow_date(series: pd.Series) -> bool:
+    # The pyarrow engine reads date-only values as date32 rather than text.
+    return isinstance(series.dtype, pd.ArrowDtype) and pa.types.is_date(series.dtype.pyarrow_dtype)
+
+
+@st.cache_data(show_spinner="Detecting datetime columns...")
+def detect_datetime_columns(_df: pd.DataFrame, detect_key: str) -> dict:
+    # Text columns whose sample mostly parses as dates, mapped to the single
+    # strftime format that fits them, or to None when only a value-by-value
+    # parse of mixed formats does. Arrow date columns are always included.
+    formats = {}
+    if _df.empty:
+        return formats
+    for col in _df.columns:
+        if is_arrow_date(_df[col]):
+            formats[col] = "%Y-%m-%d"
+            continue
+        if not is_text_dtype(_df[col]):
+            continue
+        # Spread the sample over the whole column so day-first and
+        # month-first dates are less likely to look alike.
+        positions = np.unique(np.linspace(0, len(_df) - 1, DATETIME_SAMPLE_ROWS).astype(np.int64))
+        values = _df[col].iloc[positions].dropna().astype(str)
+        if values.empty:
+            continue
+        fmt, share = infer_datetime_format(values)
+        mixed_share = pd.to_datetime(values, format="mixed", errors="coerce", utc=True).notna().mean()
+        if max(share, mixed_share) > 0.6:
+            formats[col] = fmt if share >= mixed_share else None
+    return formats
+
+
+def parse_datetime_values(values: pd.Series, fmt) -> pd.Series:
+    # Arrow's strptime parses a fixed format in C++. It lacks fractional
+    # seconds and some directives, so if it leaves any value unparsed the
+    # column goes through pandas with the same format instead.
+    if fmt is not None:
+        try:
+            arrow_values = pa.array(values.astype(pd.ArrowDtype(pa.string())))
+            parsed = pc.strptime(arrow_values, format=fmt, unit="us", error_is_null=True)
+            if parsed.null_count == arrow_values.null_count:
+                parsed = parsed.cast(pa.timestamp("us", tz="UTC")).to_pandas()
+                return parsed.set_axis(values.index).rename(values.name)
+        except pa.ArrowException:
+            pass
+    return pd.to_datetime(values, format=fmt or "mixed", errors="coerce", utc=True)
+
+
+@st.cache_resource(max_entries=32, show_spinner="Parsing datetimes...")
+def parse_datetime_column(_series: pd.Series, column_key: str, fmt) -> pd.Series:
+    # Shared across sessions like the dataset itself. Categorical columns
+    # parse each category once and expand through the codes; Arrow dates
+    # need no parsing at all.
+    if is_arrow_date(_series):
+        return _series.astype("datetime64[ms]").dt.tz_localize("UTC")
+    if isinstance(_series.dtype, pd.CategoricalDtype):
+        categories = pd.Series(_series.cat.categories.astype(str))
+        parsed = pd.DatetimeIndex(parse_datetime_values(categories, fmt))
+        values = parsed.take(_series.cat.codes.to_numpy(), allow_fill=True, fill_value=pd.NaT)
+        return pd.Series(values, index=_series.index, name=_series.name)
+    return parse_datetime_values(_series, fmt)
+
+
+def convert_datetime_columns(df: pd.DataFrame, formats: dict, dataset_key: str):
+    # Also returns, per column, how many values did not parse and became NaT.
+    out = df.copy(deep=False)
+    unparsed = {}
+    for col, fmt in formats.items():
+        out[col] = parse_datetime_column(df[col], f"{dataset_key}:{col}", fmt)
+        unparsed[col] = int(out[col].isna().sum() - df[col].isna().sum())
+    return out, unparsed
+
+
+def safe_numeric_df(df: pd.DataFrame):
+    numeric_cols = df.select_dtypes(include=np.number).columns.tolist()
+    return df[numeric_cols], numeric_cols
+
+
+PROFILE_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def take_rows(data, rows, limit=None):
+    # Row selections are positions into the shared base frame, or None for
+    # every row. Only the selected rows are copied, and selecting every row
+    # hands back the base itself.
+    if rows is None:
+        return data if limit is None else data.head(limit)
+    return data.iloc[rows if limit is None else rows[:limit]]
+
+
+def narrow_rows(rows, keep: np.ndarray) -> np.ndarray:
+    # keep is a boolean mask over the currently selected rows.
+    return np.flatnonzero(keep) if rows is None else rows[keep]
+
+
+def row_count(df: pd.DataFrame, rows) -> int:
+    return len(df) if rows is None else len(rows)
+
+
+def row_selection_key(rows) -> str:
+    if rows is None:
+        return "all"
+    return f"{len(rows)}-{hashlib.blake2b(np.ascontiguousarray(rows).tobytes(), digest_size=16).hexdigest()}"
+
+
+def hll_precision(relative_error: float) -> int:
+    # Standard error of HyperLogLog is about 1.04 / sqrt(2 ** precision).
+    return int(min(18, max(4, np.ceil(np.log2((1.04 / relative_error) ** 2)))))
+
+
+def hash_values(series: pd.Series) -> np.ndarray:
+    return pd.util.hash_pandas_object(series.dropna(), index=False).to_numpy()
+
+
+def hll_sketch(hashes: np.ndarray, precision: int) -> np.ndarray:
+    registers = np.zeros(1 << precision, dtype=np.uint8)
+    if not len(hashes):
+        return registers
+    buckets = (hashes >> np.uint64(64 - precision)).astype(np.intp)
+    rest = hashes << np.uint64(precision)
+    # Leading zeros = 64 - bit length; smearing the top set bit downwards
+    # turns the bit length into a popcount.
+    smeared = rest.copy()
+    for shift in (1, 2, 4, 8, 16, 32):
+        smeared |= smeared >> np.uint64(shift)
+    ranks = np.minimum(65 - np.bitwise_count(smeared).astype(np.uint8), 65 - precision).astype(np.uint8)
+    np.maximum.at(registers, buckets, ranks)
+    return registers
+
+
+def hll_merge(sketches) -> np.ndarray:
+    return np.maximum.reduce(list(sketches))
+
+
+def hll_estimate(registers: np.ndarray) -> float:
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * np.log(m / zeros)
+    return float(estimate)
+
+
+def profile_column(series: pd.Series, numeric: bool, approx_above: int, precision: int, sketch=None) -> dict:
+    missing = series.isna()
+    values = series[~missing]
+    missing_count = len(series) - len(values)
+    profile = {
+        "dtype": str(series.dtype),
+        "count": len(values),
+        "missing_count": missing_count,
+        "missing_pct": round(missing_count / len(series) * 100, 2) if len(series) else 0.0,
+    }
+    if len(series) > approx_above:
+        if sketch is None:
+            sketch = hll_sketch(hash_values(values), precision)
+        profile["unique_values"] = int(round(hll_estimate(sketch)))
+        profile["unique_estimated"] = True
+    else:
+        profile["unique_values"] = int(values.nunique())
+        profile["unique_estimated"] = False
+    if numeric:
+        arr = values.to_numpy(dtype="float64")
+        if len(arr):
+            q25, q50, q75 = np.quantile(arr, [0.25, 0.5, 0.75])
+            profile.update({
+                "mean": arr.mean(),
+                "std": arr.std(ddof=1) if len(arr) > 1 else np.nan,
+                "min": arr.min(),
+                "25%": q25,
+                "50%": q50,
+                "75%": q75,
+                "max": arr.max(),
+            })
+    return profile
+
+
+@st.cache_data(show_spinner="Profiling columns...")
+def profile_columns(_df: pd.DataFrame, profile_key: str, approx_above: int, precision: int,
+                    _sketches=None, max_workers: int = PROFILE_WORKERS, _rows=None) -> pd.DataFrame:
+    # One pass per column for counts, nulls, distinct values and the numeric
+    # summary, shared by the overview and the analysis tabs. Above
+    # approx_above rows distinct values are estimated with HyperLogLog,
+    # reusing any precomputed sketch in _sketches. With _rows, each worker
+    # gathers only its own column's selected rows.
+    numeric_cols = set(safe_numeric_df(_df)[1])
+    sketches = _sketches or {}
+
+    def profile(col):
+        series = take_rows(_df[col], _rows)
+        return profile_column(series, col in numeric_cols, approx_above, precision, sketches.get(col))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        profiles = list(pool.map(profile, _df.columns))
+    profile = pd.DataFrame(profiles)
+    profile.insert(0, "column", _df.columns)
+    profile["numeric"] = profile["column"].isin(numeric_cols)
+    return profile
+
+
+def is_text_dtype(series: pd.Series) -> bool:
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+    return dtype == "object" or pd.api.types.is_string_dtype(dtype)
+
+
+def smallest_int_dtype(series: pd.Series):
+    lo, hi = series.min(), series.max()
+    if pd.isna(lo):
+        return None
+    for np_type, pa_type in [(np.int8, pa.int8()), (np.int16, pa.int16()), (np.int32, pa.int32())]:
+        info = np.iinfo(np_type)
+        if info.min <= lo and hi <= info.max:
+            return pd.ArrowDtype(pa_type) if isinstance(series.dtype, pd.ArrowDtype) else np_type
+    return None
+
+
+# Text columns become categoricals only when distinct values are rare: the
+# codes save memory when values repeat, but near-unique columns would pay
+# for a category table as large as the column itself.
+CATEGORY_MAX_RATIO = 0.05
+
+
+def compact_column(series: pd.Series, max_category_ratio: float) -> pd.Series:
+    if is_text_dtype(series) and not isinstance(series.dtype, pd.CategoricalDtype):
+        if series.nunique(dropna=True) <= max_category_ratio * len(series):
+            return series.astype("category")
+        return series.astype(pd.ArrowDtype(pa.string()))
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return series
+    if pd.api.types.is_integer_dtype(series.dtype):
+        target = smallest_int_dtype(series)
+        return series.astype(target) if target is not None else series
+    if pd.api.types.is_float_dtype(series.dtype):
+        target = pd.ArrowDtype(pa.float32()) if isinstance(series.dtype, pd.ArrowDtype) else np.float32
+        narrowed = series.astype(target)
+        # Only keep float32 when every value survives the round trip.
+        if (narrowed.astype(series.dtype) == series).fillna(True).all():
+            return narrowed
+    return series
+
+
+def compact_dtypes(df: pd.DataFrame, max_category_ratio: float = CATEGORY_MAX_RATIO):
+    compacted = pd.DataFrame(
+        {col: compact_column(df[col], max_category_ratio) for col in df.columns},
+        index=df.index
+    )
+    memory_report = pd.DataFrame({
+        "memory_mb_before": (df.memory_usage(deep=True, index=False) / 1_000_000).round(3),
+        "memory_mb_after": (compacted.memory_usage(deep=True, index=False) / 1_000_000).round(3),
+    })
+    return compacted, memory_report
+
+
+TOP_K_EXACT_ROWS = 200_000
+TOP_K_CHUNK_ROWS = 100_000
+CATEGORY_OPTION_LIMIT = 1_000
+PIE_MAX_SLICES = 20
+
+
+def top_k_values(series: pd.Series, k: int, dropna: bool = True) -> pd.DataFrame:
+    # Exact value_counts for small frames and categoricals. Larger columns
+    # go through a mergeable Misra-Gries summary built chunk by chunk on
+    # the native values, so memory stays bounded by the summary capacity;
+    # a second pass counts the surviving candidates exactly.
+    if len(series) <= TOP_K_EXACT_ROWS or isinstance(series.dtype, pd.CategoricalDtype):
+        counts = series.value_counts(dropna=dropna)
+        counts = counts[counts > 0].head(k)
+    else:
+        capacity = max(50 * k, 1_000)
+        summary = pd.Series(dtype="int64")
+        for start in range(0, len(series), TOP_K_CHUNK_ROWS):
+            chunk_counts = series.iloc[start:start + TOP_K_CHUNK_ROWS].value_counts()
+            summary = summary.add(chunk_counts, fill_value=0)
+            if len(summary) > capacity:
+                cutoff = summary.nlargest(capacity + 1).iloc[-1]
+                summary = summary[summary > cutoff] - cutoff
+        candidates = summary.nlargest(min(len(summary), 4 * k)).index
+        counts = series[series.isin(candidates)].value_counts()
+        if not dropna:
+            missing = int(series.isna().sum())
+            if missing:
+                counts = pd.concat([counts, pd.Series([missing], index=[np.nan])])
+        counts = counts.sort_values(ascending=False, kind="stable").head(k)
+    return counts.rename_axis("value").reset_index(name="count")
+
+
+def category_options(series: pd.Series, limit: int = CATEGORY_OPTION_LIMIT):
+    # Returns (options, truncated). Columns with more distinct values than
+    # the limit offer only their most frequent values, in frequency order;
+    # otherwise every value is offered in order of first appearance.
+    if len(series) <= TOP_K_EXACT_ROWS:
+        options = series.dropna().astype(str).unique().tolist()
+        if len(options) <= limit:
+            return options, False
+    counts = top_k_values(series, limit + 1)
+    if len(counts) > limit:
+        return counts["value"].head(limit).astype(str).tolist(), True
+    return pd.Series(series.dropna().unique()).astype(str).unique().tolist(), False
+
+
+def row_fingerprints(df: pd.DataFrame, ignore_columns=()) -> pd.DataFrame:
+    # 64-bit hash per row over all columns and, when ignore_columns is
+    # given, over the remaining data columns. Duplicate checks compare
+    # these instead of re-hashing every cell.
+    hashes = {"all_columns": pd.util.hash_pandas_object(df, index=False)}
+    data_cols = [c for c in df.columns if c not in ignore_columns]
+    if ignore_columns and data_cols:
+        hashes["data_columns"] = pd.util.hash_pandas_object(df[data_cols], index=False)
+    return pd.DataFrame(hashes, index=df.index)
+
+
+@st.cache_resource(max_entries=8, show_spinner="Fingerprinting rows...")
+def converted_row_fingerprints(_df: pd.DataFrame, search_key: str, ignore_columns=()) -> pd.DataFrame:
+    # Parsed datetimes can make rows equal that differed as text, so the
+    # fingerprints stored with a dataset are recomputed for each set of
+    # converted columns named in search_key.
+    return row_fingerprints(_df, ignore_columns)
+
+
+CHART_POINT_BUDGET = 10_000
+DENSITY_BINS = 200
+
+
+def axis_positions(series: pd.Series):
+    # Numbers and datetimes as float64 with NaN for missing values; None for
+    # axes that have no numeric order.
+    if is_arrow_date(series):
+        series = series.astype("datetime64[ms]")
+    if pd.api.types.is_datetime64_any_dtype(series):
+        if getattr(series.dt, "tz", None) is not None:
+            series = series.dt.tz_convert(None)
+        values = series.to_numpy(dtype="datetime64[ns]")
+        positions = values.astype("int64").astype("float64")
+        positions[np.isnat(values)] = np.nan
+        return positions
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(dtype="float64", na_value=np.nan)
+    return None
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    # Largest-Triangle-Three-Buckets over points sorted by x: keeps the end
+    # points and, from each bucket in between, the point spanning the
+    # largest triangle with the last kept point and the next bucket's mean.
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        mean_x, mean_y = x[end:next_end].mean(), y[end:next_end].mean()
+        prev_x, prev_y = x[kept[i]], y[kept[i]]
+        area = np.abs((prev_x - mean_x) * (y[start:end] - prev_y) - (prev_x - x[start:end]) * (mean_y - prev_y))
+        kept[i + 1] = start + int(area.argmax())
+    return kept
+
+
+def group_codes(df: pd.DataFrame, color_col) -> np.ndarray:
+    if color_col is None:
+        return np.zeros(len(df), dtype=np.int64)
+    return pd.factorize(df[color_col], use_na_sentinel=False)[0]
+
+
+def lttb_rows(df: pd.DataFrame, x_col: str, y_col: str, color_col, budget: int):
+    # Row positions of a line reduced to at most budget points, and how they
+    # were chosen. Normally LTTB per color group, each sorted by x, with
+    # three points per group and the rest of the budget shared in proportion
+    # to group size. An x-axis without a numeric order keeps the row order;
+    # a y-axis without one gets evenly spaced rows, and too many groups for
+    # three points each get a stratified sample.
+    y = axis_positions(df[y_col])
+    x = axis_positions(df[x_col])
+    valid = ~np.isnan(y) if y is not None else np.ones(len(df), dtype=bool)
+    if x is None:
+        x = np.arange(len(df), dtype="float64")
+    valid &= ~np.isnan(x)
+    rows = np.flatnonzero(valid)
+    if y is None:
+        if len(rows) > budget:
+            rows = rows[np.linspace(0, len(rows) - 1, budget).astype(np.int64)]
+        return rows, "evenly spaced along the rows, since the y-axis is not numeric"
+    groups = group_codes(df, color_col)
+    n_groups = len(np.unique(groups[rows]))
+    if 3 * n_groups > budget:
+        return (
+            stratified_sample_rows(df, color_col, budget),
+            "sampled at random within each color group, since there are too many groups for LTTB"
+        )
+    rows = rows[np.lexsort((x[rows], groups[rows]))]
+    kept = []
+    for part in np.split(rows, np.flatnonzero(np.diff(groups[rows])) + 1):
+        n_out = 3 + int((budget - 3 * n_groups) * len(part) / max(len(rows), 1))
+        kept.append(part[lttb_indices(x[part], y[part], n_out)])
+    rows = np.concatenate(kept) if kept else rows
+    return rows, "chosen per line with LTTB (largest triangle three buckets) along the sorted x-axis"
+
+
+def stratified_sample_rows(df: pd.DataFrame, color_col, budget: int, seed: int = 0) -> np.ndarray:
+    # At most budget random rows in their original order. Every color group
+    # keeps at least one row and the rest of the budget is shared in
+    # proportion to group size; with more groups than the budget, rows are
+    # drawn uniformly.
+    groups = group_codes(df, color_col)
+    counts = np.bincount(groups)
+    order = np.random.default_rng(seed).permutation(len(df))
+    if len(counts) > budget:
+        return np.sort(order[:budget])
+    quota = np.minimum(counts, 1 + counts * (budget - len(counts)) // len(df))
+    shuffled = groups[order]
+    rank = pd.Series(shuffled).groupby(shuffled).cumcount().to_numpy()
+    return np.sort(order[rank < quota[shuffled]])
+
+
+def density_figure(df: pd.DataFrame, x_col: str, y_col: str, title: str, bins: int = DENSITY_BINS):
+    # 2-D histogram binned on the server, so the browser receives a
+    # bins x bins grid instead of every point. None when an axis is not
+    # numeric or datetime.
+    x = axis_positions(df[x_col])
+    y = axis_positions(df[y_col])
+    if x is None or y is None:
+        return None
+    valid = ~np.isnan(x) & ~np.isnan(y)
+    if not valid.any():
+        return None
+    counts, x_edges, y_edges = np.histogram2d(x[valid], y[valid], bins=bins)
+    centers = []
+    for col, edges in ((x_col, x_edges), (y_col, y_edges)):
+        mid = (edges[:-1] + edges[1:]) / 2
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            mid = pd.to_datetime(mid.astype("int64"))
+        centers.append(mid)
+    fig = go.Figure(go.Heatmap(
+        x=centers[0], y=centers[1], z=np.where(counts.T > 0, counts.T, np.nan),
+        colorscale="Viridis", colorbar={"title": "rows"}
+    ))
+    fig.update_layout(title=title, xaxis_title=x_col, yaxis_title=y_col)
+    return fig
+
+
+BOX_MAX_GROUPS = 50
+
+
+@st.cache_data(show_spinner=False)
+def bar_totals(_df: pd.DataFrame, selection_key: str, x_col: str, y_col: str, color_col=None) -> pd.DataFrame:
+    # One row per (x, color) group holding the sum of y, or its non-missing
+    # count when y is not numeric, so the chart draws one segment per group.
+    keys = list(dict.fromkeys([x_col] + ([color_col] if color_col else [])))
+    numeric = pd.api.types.is_numeric_dtype(_df[y_col])
+    name = y_col if y_col not in keys else f"{y_col} ({'sum' if numeric else 'count'})"
+    grouped = _df.groupby(keys, dropna=False, observed=True, sort=False)[y_col]
+    totals = grouped.sum() if numeric else grouped.count()
+    return totals.rename(name).reset_index()
+
+
+@st.cache_data(show_spinner=False)
+def histogram_bins(_df: pd.DataFrame, selection_key: str, col: str, bins: int) -> pd.DataFrame:
+    # Equal-width bin counts from np.histogram with start/end edges in the
+    # column's own units. Columns without a numeric order are counted per
+    # value instead.
+    series = _df[col]
+    positions = axis_positions(series)
+    if positions is None:
+        counts = top_k_values(series, CATEGORY_OPTION_LIMIT)
+        counts["value"] = counts["value"].astype(str)
+        return counts
+    positions = positions[~np.isnan(positions)]
+    if not len(positions):
+        return pd.DataFrame({"start": [], "end": [], "count": []})
+    counts, edges = np.histogram(positions, bins=bins)
+    out = pd.DataFrame({"start": edges[:-1], "end": edges[1:], "count": counts})
+    if pd.api.types.is_datetime64_any_dtype(series):
+        out["start"] = pd.to_datetime(out["start"].astype("int64"))
+        out["end"] = pd.to_datetime(out["end"].astype("int64"))
+    return out
+
+
+def histogram_figure(counts: pd.DataFrame, col: str, title: str):
+    if "value" in counts.columns:
+        fig = px.bar(counts, x="value", y="count", title=title)
+        fig.update_layout(xaxis_title=col)
+        return fig
+    width = counts["end"] - counts["start"]
+    if pd.api.types.is_timedelta64_dtype(width):
+        width = width.dt.total_seconds() * 1000
+    fig = go.Figure(go.Bar(
+        x=counts["start"] + (counts["end"] - counts["start"]) / 2,
+        y=counts["count"],
+        width=width,
+        customdata=np.column_stack([counts["start"].astype(str), counts["end"].astype(str)]),
+        hovertemplate="%{customdata[0]} to %{customdata[1]}<br>count=%{y}<extra></extra>"
+    ))
+    fig.update_layout(title=title, xaxis_title=col, yaxis_title="count", bargap=0)
+    return fig
+
+
+@st.cache_data(show_spinner=False)
+def box_statistics(_df: pd.DataFrame, selection_key: str, y_col: str, group_col=None,
+                   max_groups: int = BOX_MAX_GROUPS):
+    # Tukey box statistics for the largest groups: linearly interpolated
+    # quartiles (as Plotly computes them), whiskers at the furthest values
+    # within 1.5 IQR, and how many outliers lie beyond them. Returns
+    # (stats, total groups), or (None, 0) when y is not numeric or datetime.
+    values = axis_positions(_df[y_col])
+    if values is None:
+        return None, 0
+    if group_col is None:
+        codes, labels = np.zeros(len(_df), dtype=np.int64), pd.Index([y_col])
+    else:
+        codes, labels = pd.factorize(_df[group_col])
+        labels = pd.Index(labels).astype(str)
+    valid = (codes >= 0) & ~np.isnan(values)
+    codes, values = codes[valid], values[valid]
+    if not len(values):
+        columns = ["group", "q1", "median", "q3", "lowerfence", "upperfence", "mean", "count", "outliers"]
+        return pd.DataFrame(columns=columns), 0
+    sizes = np.bincount(codes, minlength=len(labels))
+    keep = np.argsort(-sizes, kind="stable")[:max_groups]
+    keep = keep[sizes[keep] > 0]
+    selected = np.isin(codes, keep)
+    codes, values = codes[selected], values[selected]
+
+    grouped = pd.Series(values).groupby(codes)
+    quartiles = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    iqr = quartiles[0.75] - quartiles[0.25]
+    low = np.full(len(labels), np.nan)
+    high = np.full(len(labels), np.nan)
+    low[quartiles.index] = quartiles[0.25] - 1.5 * iqr
+    high[quartiles.index] = quartiles[0.75] + 1.5 * iqr
+    inside = (values >= low[codes]) & (values <= high[codes])
+    fences = pd.Series(values[inside]).groupby(codes[inside]).agg(["min", "max"])
+
+    stats = pd.DataFrame({
+        "q1": quartiles[0.25],
+        "median": quartiles[0.5],
+        "q3": quartiles[0.75],
+        "lowerfence": fences["min"],
+        "upperfence": fences["max"],
+        "mean": grouped.mean(),
+    }).loc[keep]
+    if pd.api.types.is_datetime64_any_dtype(_df[y_col]):
+        stats = stats.apply(lambda col: pd.to_datetime(col.astype("int64")))
+    stats.insert(0, "group", labels[keep])
+    stats["count"] = sizes[keep]
+    stats["outliers"] = np.bincount(codes[~inside], minlength=len(labels))[keep]
+    return stats.reset_index(drop=True), int((sizes > 0).sum())
+
+
+def box_figure(stats: pd.DataFrame, y_col: str, group_col, title: str):
+    fig = go.Figure(go.Box(
+        x=stats["group"],
+        q1=stats["q1"],
+        median=stats["median"],
+        q3=stats["q3"],
+        lowerfence=stats["lowerfence"],
+        upperfence=stats["upperfence"],
+        mean=stats["mean"],
+        name=y_col,
+        boxpoints=False
+    ))
+    fig.update_layout(title=title, xaxis_title=group_col, yaxis_title=y_col)
+    return fig
+
+
+CORR_BLOCK_ROWS = 100_000
+CORR_SAMPLE_ROWS = 100_000
+CORR_TOP_PAIRS = 20
+CORR_HEATMAP_MAX_COLUMNS = 30
+
+
+@st.cache_data(show_spinner="Computing correlations...")
+def correlation_matrix(_df: pd.DataFrame, selection_key: str, columns: tuple, sample_rows=None, seed: int = 0):
+    # Pairwise-complete Pearson correlations, as DataFrame.corr computes them,
+    # accumulated over row blocks with four matrix products: per pair, the
+    # rows where both values are present, their sums, sums of squares and
+    # cross products. Columns are centred on their means first for numerical
+    # stability. With sample_rows set, a seeded random subset of rows is used.
+    # Returns (correlations, pair row counts) as column x column frames.
+    frame = _df[list(columns)]
+    rows = None
+    if sample_rows is not None and len(frame) > sample_rows:
+        rows = np.sort(np.random.default_rng(seed).choice(len(frame), sample_rows, replace=False))
+    center = frame.mean().to_numpy(dtype="float64", na_value=0.0)
+    n_cols = len(columns)
+    counts, sums, squares, products = (np.zeros((n_cols, n_cols)) for _ in range(4))
+    n_rows = len(frame) if rows is None else len(rows)
+    for start in range(0, n_rows, CORR_BLOCK_ROWS):
+        stop = start + CORR_BLOCK_ROWS
+        block = frame.iloc[start:stop] if rows is None else frame.iloc[rows[start:stop]]
+        values = block.to_numpy(dtype="float64", na_value=np.nan) - center
+        present = ~np.isnan(values)
+        values = np.where(present, values, 0.0)
+        weights = present.astype("float64")
+        counts += weights.T @ weights
+        sums += values.T @ weights
+        squares += (values * values).T @ weights
+        products += values.T @ values
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = products - sums * sums.T / counts
+        variance = squares - sums * sums / counts
+        corr = np.clip(covariance / np.sqrt(variance * variance.T), -1.0, 1.0)
+    corr[counts < 2] = np.nan
+    diagonal = np.diag(variance) > 0
+    corr[np.diag_indices(n_cols)] = np.where(diagonal, 1.0, np.nan)
+    labels = list(columns)
+    return (
+        pd.DataFrame(corr, index=labels, columns=labels),
+        pd.DataFrame(counts.astype("int64"), index=labels, columns=labels),
+    )
+
+
+def correlation_pairs(corr: pd.DataFrame, counts: pd.DataFrame, k: int) -> pd.DataFrame:
+    # The k column pairs with the largest absolute correlation, each with a
+    # 95% confidence interval from the Fisher z-transform of r over the rows
+    # the pair was computed on.
+    first, second = np.triu_indices(len(corr), k=1)
+    r = corr.to_numpy()[first, second]
+    n = counts.to_numpy()[first, second]
+    order = np.argsort(-np.where(np.isnan(r), -1.0, np.abs(r)), kind="stable")[:k]
+    order = order[~np.isnan(r[order])]
+    first, second, r, n = first[order], second[order], r[order], n[order]
+    z = np.arctanh(np.clip(r, -0.999999, 0.999999))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        half_width = np.where(n > 3, 1.96 / np.sqrt(n - 3), np.nan)
+    return pd.DataFrame({
+        "column_a": corr.index[first],
+        "column_b": corr.columns[second],
+        "correlation": r.round(4),
+        "rows": n,
+        "ci_low": np.tanh(z - half_width).round(4),
+        "ci_high": np.tanh(z + half_width).round(4),
+    })
+
+
+WEBGL_POINT_THRESHOLD = 1_000
+
+
+def payload_estimate(value) -> int:
+    # Approximate serialized size without encoding the figure a second time:
+    # numeric arrays travel base64-encoded at 4/3 of their buffer size,
+    # everything else as JSON text.
+    if isinstance(value, dict):
+        return sum(len(key) + 4 + payload_estimate(item) for key, item in value.items())
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind in "biuf":
+            return value.nbytes * 4 // 3 + 30
+        return int(pd.Series(value.ravel()).astype(str).str.len().sum()) + 3 * value.size
+    if isinstance(value, (list, tuple)):
+        return sum(payload_estimate(item) + 1 for item in value)
+    return len(str(value)) + 2
+
+
+def show_figure(fig, webgl_above: int = WEBGL_POINT_THRESHOLD):
+    # Delivery for the chart builder and the correlation heatmap: SVG scatter
+    # traces above the threshold become WebGL, datetime axes are sent as epoch
+    # milliseconds so they travel as base64 typed arrays like numeric columns
+    # instead of ISO strings, and the payload size is estimated from the
+    # arrays rather than by serializing the figure twice.
+    points = sum(len(trace.x) for trace in fig.data if trace.type == "scatter" and trace.x is not None)
+    if points > webgl_above:
+        fig = go.Figure(
+            data=[
+                go.Scattergl({k: v for k, v in trace.to_plotly_json().items() if k != "type"})
+                if trace.type == "scatter" else trace
+                for trace in fig.data
+            ],
+            layout=fig.layout
+        )
+    for trace in fig.data:
+        for axis in ("x", "y"):
+            values = getattr(trace, axis, None)
+            if isinstance(values, np.ndarray) and values.dtype.kind == "M":
+                millis = values.astype("datetime64[ms]")
+                trace[axis] = np.where(np.isnat(millis), np.nan, millis.astype("int64").astype("float64"))
+                axis_ref = getattr(trace, f"{axis}axis", None) or axis
+                fig.layout[f"{axis}axis{axis_ref[1:]}"].type = "date"
+    payload = payload_estimate(fig.to_plotly_json())
+    st.plotly_chart(fig, use_container_width=True)
+    webgl = sum(trace.type == "scattergl" for trace in fig.data)
+    st.caption(
+        f"Chart payload: about {payload / 1_000:,.1f} KB"
+        + (f", {webgl} WebGL trace(s)" if webgl else "")
+    )
+
+
+OUT_OF_CORE_SAMPLE_ROWS = 50_000
+# Out-of-core Parquet is queried in place for as long as the view is open,
+# so it lives outside the parse cache and is evicted on its own.
+OUT_OF_CORE_DIR = PARSE_CACHE_DIR / "out_of_core"
+
+
+def out_of_core_path(fingerprint: str, **options) -> Path:
+    name = parse_cache_path(fingerprint, out_of_core=True, **options).with_suffix(".parquet").name
+    return OUT_OF_CORE_DIR / name
+
+
+def widened_column_types(source: CsvSource, read_options, parse_options, schema: pa.Schema) -> dict:
+    # One pass with every typed column read as text: each batch is cast to
+    # the column's current type, and a column that does not fit is widened
+    # (integers to float, otherwise to string), so all conflicts in the file
+    # are found together. Returns only the columns whose type changed.
+    types = {i: field.type for i, field in enumerate(schema) if not pa.types.is_string(field.type)}
+    convert_options = pacsv.ConvertOptions(
+        column_types={schema.field(i).name: pa.string() for i in types},
+        strings_can_be_null=True,
+    )
+    with source.open() as stream:
+        reader = pacsv.open_csv(stream, read_options=read_options, parse_options=parse_options,
+                                convert_options=convert_options)
+        for batch in reader:
+            for i, arrow_type in types.items():
+                while not pa.types.is_string(arrow_type):
+                    try:
+                        pc.cast(batch.column(i), arrow_type)
+                        break
+                    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                        arrow_type = pa.float64() if pa.types.is_integer(arrow_type) else pa.string()
+                types[i] = arrow_type
+    return {schema.field(i).name: arrow_type for i, arrow_type in types.items() if arrow_type != schema.field(i).type}
+
+
+def convert_csv_to_parquet(source: CsvSource, path: Path, encoding: str, delimiter: str = ",",
+                           skip_rows: int = 0, has_header: bool = True, constant_columns=None) -> Path:
+    # Stream CSV blocks into Parquet row groups without holding the table in
+    # memory. Types are inferred from the first block, so on the first value
+    # that does not fit, one text-only pass finds every column to widen and
+    # the file is streamed again; every other column keeps its type. Should
+    # the CSV reader still reject a value, the column named in the error is
+    # widened on its own.
+    try:
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        pass
+    constant_columns = constant_columns or {}
+    OUT_OF_CORE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    read_options = pacsv.ReadOptions(
+        encoding=encoding,
+        skip_rows=skip_rows,
+        autogenerate_column_names=not has_header,
+        block_size=16 << 20,
+    )
+    parse_options = pacsv.ParseOptions(delimiter=delimiter)
+    column_types = {}
+    schema = None
+    validated = False
+    while True:
+        try:
+            with source.open() as stream:
+                reader = pacsv.open_csv(
+                    stream,
+                    read_options=read_options,
+                    parse_options=parse_options,
+                    convert_options=pacsv.ConvertOptions(column_types=column_types, strings_can_be_null=True),
+                )
+                schema = reader.schema
+                out_schema = schema
+                for name in constant_columns:
+                    out_schema = out_schema.append(pa.field(name, pa.string()))
+                with pq.ParquetWriter(tmp_path, out_schema) as writer:
+                    for batch in reader:
+                        constants = [pa.repeat(pa.scalar(value, pa.string()), batch.num_rows) for value in constant_columns.values()]
+                        writer.write_batch(pa.RecordBatch.from_arrays(batch.columns + constants, schema=out_schema))
+            break
+        except pa.ArrowInvalid as e:
+            tmp_path.unlink(missing_ok=True)
+            column = re.search(r"CSV column #(\d+)", str(e))
+            if schema is None or column is None:
+                raise
+            if not validated:
+                validated = True
+                column_types = widened_column_types(source, read_options, parse_options, schema)
+                if column_types:
+                    continue
+            field = schema.field(int(column.group(1)))
+            if pa.types.is_string(field.type):
+                raise
+            widened = pa.string()
+            value = re.search(r"invalid value '(.*)'", str(e))
+            if pa.types.is_integer(field.type) and value is not None:
+                try:
+                    float(value.group(1))
+                    widened = pa.float64()
+                except ValueError:
+                    pass
+            column_types[field.name] = widened
+    os.replace(tmp_path, path)
+    evict_parse_cache(PARSE_CACHE_MAX_BYTES, keep=path, directory=OUT_OF_CORE_DIR)
+    return path
+
+
+def is_arrow_text(arrow_type: pa.DataType) -> bool:
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    return pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
+
+
+def is_arrow_numeric(arrow_type: pa.DataType) -> bool:
+    return pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type)
+
+
+def and_expressions(*exprs):
+    result = None
+    for expr in exprs:
+        if expr is not None:
+            result = expr if result is None else result & expr
+    return result
+
+
+def ooc_query(dataset: ds.Dataset, filter_expr=None, aggregates=None, keys=None, projections=None) -> pa.Table:
+    # scan -> filter -> project -> aggregate, executed by Arrow's streaming
+    # engine so only the aggregated result is materialized.
+    scan_options = ac.ScanNodeOptions(dataset, filter=filter_expr) if filter_expr is not None else ac.ScanNodeOptions(dataset)
+    nodes = [ac.Declaration("scan", scan_options)]
+    if filter_expr is not None:
+        nodes.append(ac.Declaration("filter", ac.FilterNodeOptions(filter_expr)))
+    if projections:
+        nodes.append(ac.Declaration("project", ac.ProjectNodeOptions(list(projections.values()), list(projections))))
+    if aggregates:
+        nodes.append(ac.Declaration("aggregate", ac.AggregateNodeOptions(aggregates, keys=keys or [])))
+    return ac.Declaration.from_sequence(nodes).to_table()
+
+
+def ooc_search_expression(schema: pa.Schema, columns, text: str, case_sensitive: bool, use_regex: bool):
+    match = pc.match_substring_regex if use_regex else pc.match_substring
+    expr = None
+    for name in columns:
+        field = pc.field(name)
+        if not is_arrow_text(schema.field(name).type) or pa.types.is_dictionary(schema.field(name).type):
+            field = field.cast(pa.string())
+        term = match(field, text, ignore_case=not case_sensitive)
+        expr = term if expr is None else expr | term
+    return expr
+
+
+def ooc_null_counts(dataset: ds.Dataset, columns, filter_expr=None) -> pd.Series:
+    table = ooc_query(dataset, filter_expr, [(c, "count", pc.CountOptions("only_null"), c) for c in columns])
+    return pd.Series({c: table[c][0].as_py() for c in columns})
+
+
+def ooc_top_values(dataset: ds.Dataset, col: str, filter_expr=None, k: int = 20) -> pd.DataFrame:
+    table = ooc_query(dataset, filter_expr, [(col, "hash_count", pc.CountOptions("all"), "count")], keys=[col])
+    if table.num_rows:
+        table = table.take(pc.select_k_unstable(table, k, sort_keys=[("count", "descending")]))
+    return table.select([col, "count"]).to_pandas().rename(columns={col: "value"})
+
+
+def ooc_numeric_summary(dataset: ds.Dataset, numeric_cols, filter_expr=None) -> pd.DataFrame:
+    # Grouping on a constant key lets tdigest return all quantiles at once.
+    projections = {c: pc.field(c) for c in numeric_cols}
+    projections["__all__"] = pc.scalar(0)
+    aggregates = []
+    for c in numeric_cols:
+        aggregates += [
+            (c, "hash_count", None, f"{c}|count"),
+            (c, "hash_mean", None, f"{c}|mean"),
+            (c, "hash_stddev", pc.VarianceOptions(ddof=1), f"{c}|std"),
+            (c, "hash_tdigest", pc.TDigestOptions(q=[0, 0.25, 0.5, 0.75, 1]), f"{c}|q"),
+        ]
+    row = ooc_query(dataset, filter_expr, aggregates, keys=["__all__"], projections=projections).to_pylist()
+    rows = []
+    for c in numeric_cols:
+        quantiles = (row[0][f"{c}|q"] if row else None) or [None] * 5
+        rows.append({
+            "count": row[0][f"{c}|count"] if row else 0,
+            "mean": row[0][f"{c}|mean"] if row else None,
+            "std": row[0][f"{c}|std"] if row else None,
+            "min": quantiles[0],
+            "25%": quantiles[1],
+            "50%": quantiles[2],
+            "75%": quantiles[3],
+            "max": quantiles[4],
+        })
+    return pd.DataFrame(rows, index=numeric_cols)
+
+
+def ooc_min_max(dataset: ds.Dataset, col: str, filter_expr=None):
+    table = ooc_query(dataset, filter_expr, [(col, "min_max", None, "min_max")])
+    bounds = table["min_max"][0].as_py() or {}
+    return bounds.get("min"), bounds.get("max")
+
+
+def ooc_head(dataset: ds.Dataset, columns, filter_expr=None, limit: int = 200) -> pd.DataFrame:
+    return dataset.head(limit, columns=columns, filter=filter_expr).to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def ooc_sample(dataset: ds.Dataset, columns, n_rows: int, filter_expr=None, limit: int = OUT_OF_CORE_SAMPLE_ROWS) -> pd.DataFrame:
+    # Evenly spaced rows across all n_rows matching rows, so a chart covers
+    # the whole file rather than its first row groups.
+    if n_rows <= limit:
+        return ooc_head(dataset, columns, filter_expr, limit)
+    indices = np.unique(np.linspace(0, n_rows - 1, limit).astype(np.int64))
+    table = dataset.scanner(columns=columns, filter=filter_expr).take(pa.array(indices))
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def render_out_of_core_view(dataset: ds.Dataset, columns, source_column=None):
+    schema = dataset.schema
+    st.info(
+        "Out-of-core mode: the data stays on disk as Parquet and every view below runs as an Arrow query. "
+        "Only result-sized frames are loaded into memory."
+    )
+
+    st.subheader("Dataset overview")
+    total_rows = dataset.count_rows()
+    null_counts = ooc_null_counts(dataset, columns)
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Rows", f"{total_rows:,}")
+    c2.metric("Columns", f"{len(columns):,}")
+    c3.metric("Missing cells", f"{int(null_counts.sum()):,}")
+    c4.metric("Duplicate rows", "n/a")
+
+    with st.expander("Column information", expanded=False):
+        st.dataframe(pd.DataFrame({
+            "column": columns,
+            "dtype": [str(schema.field(c).type) for c in columns],
+            "missing_count": [int(null_counts[c]) for c in columns],
+            "missing_pct": [round(null_counts[c] / max(total_rows, 1) * 100, 2) for c in columns],
+        }), use_container_width=True)
+
+    st.subheader("Data preview")
+    preview_rows = st.slider("Preview rows", min_value=5, max_value=200, value=20, step=5, key="ooc_preview_rows")
+    st.dataframe(ooc_head(dataset, columns, limit=preview_rows), use_container_width=True)
+
+    source_expr = None
+    if source_column is not None:
+        st.sidebar.header("Source filter")
+        source_options = ooc_top_values(dataset, source_column, k=10_000)["value"].dropna().astype(str).sort_values().tolist()
+        selected_sources = st.sidebar.multiselect("Filter by source file", options=source_options, default=source_options)
+        if selected_sources:
+            source_expr = pc.field(source_column).cast(pa.string()).isin(selected_sources)
+
+    st.subheader("Search")
+    search_text = st.text_input("Search across all columns", key="ooc_search")
+    case_sensitive = st.checkbox("Case sensitive", value=False, key="ooc_case")
+    use_regex = st.checkbox(
+        "Use regex", value=False, key="ooc_regex",
+        help="Out-of-core search matches each cell on its own, so a regex cannot span columns."
+    )
+
+    search_expr = None
+    if search_text.strip():
+        if use_regex:
+            try:
+                re.compile(search_text)
+            except re.error as e:
+                st.error(f"Invalid regex: {e}")
+                st.stop()
+        search_expr = ooc_search_expression(schema, columns, search_text, case_sensitive, use_regex)
+
+    filter_expr = and_expressions(source_expr, search_expr)
+    try:
+        matching_rows = dataset.count_rows(filter=filter_expr)
+    except pa.ArrowInvalid as e:
+        st.error(f"Invalid search: {e}")
+        st.stop()
+    st.write(f"Matching rows: **{matching_rows:,}**")
+    st.dataframe(ooc_head(dataset, columns, filter_expr), use_container_width=True)
+
+    st.subheader("Filters")
+    filter_mode = st.radio("Choose filter mode", ["None", "Categorical", "Numeric range"], horizontal=True, key="ooc_filter_mode")
+    text_cols = [c for c in columns if is_arrow_text(schema.field(c).type)]
+    numeric_cols = [c for c in columns if is_arrow_numeric(schema.field(c).type)]
+
+    if filter_mode == "Categorical":
+        if text_cols:
+            cat_col = st.selectbox("Select categorical column", text_cols, key="ooc_cat_col")
+            top = ooc_top_values(dataset, cat_col, filter_expr, k=1000)
+            unique_vals = top["value"].dropna().astype(str).tolist()
+            if len(top) == 1000:
+                st.caption("Showing the 1,000 most frequent values.")
+            selected_vals = st.multiselect("Values", unique_vals, default=unique_vals[:10], key="ooc_cat_vals")
+            if selected_vals:
+                filter_expr = and_expressions(filter_expr, pc.field(cat_col).cast(pa.string()).isin(selected_vals))
+        else:
+            st.info("No categorical columns found.")
+    elif filter_mode == "Numeric range":
+        if numeric_cols:
+            num_col = st.selectbox("Select numeric column", numeric_cols, key="ooc_num_col")
+            min_val, max_val = ooc_min_max(dataset, num_col, filter_expr)
+            if min_val is not None and min_val < max_val:
+                range_vals = st.slider("Range", min_value=float(min_val), max_value=float(max_val),
+                                       value=(float(min_val), float(max_val)), key="ooc_range")
+                filter_expr = and_expressions(
+                    filter_expr,
+                    (pc.field(num_col) >= range_vals[0]) & (pc.field(num_col) <= range_vals[1]),
+                )
+        else:
+            st.info("No numeric columns found.")
+
+    filtered_rows = dataset.count_rows(filter=filter_expr)
+    st.write(f"Rows after filters: **{filtered_rows:,}**")
+
+    st.subheader("Analysis")
+    tab1, tab2 = st.tabs(["Summary", "Missing data"])
+
+    with tab1:
+        if numeric_cols:
+            st.markdown("### Numeric summary")
+            st.dataframe(ooc_numeric_summary(dataset, numeric_cols, filter_expr), use_container_width=True)
+        else:
+            st.info("No numeric columns available for summary statistics.")
+
+        st.markdown("### Top values")
+        top_col = st.selectbox("Choose a column for frequency counts", columns, key="ooc_top_col")
+        st.dataframe(ooc_top_values(dataset, top_col, filter_expr), use_container_width=True)
+
+    with tab2:
+        filtered_nulls = ooc_null_counts(dataset, columns, filter_expr)
+        miss = pd.DataFrame({
+            "column": columns,
+            "missing_count": [int(filtered_nulls[c]) for c in columns],
+            "missing_pct": [round(filtered_nulls[c] / max(filtered_rows, 1) * 100, 2) for c in columns],
+        }).sort_values("missing_count", ascending=False)
+        st.dataframe(miss, use_container_width=True)
+        miss_nonzero = miss[miss["missing_count"] > 0]
+        if not miss_nonzero.empty:
+            st.plotly_chart(px.bar(miss_nonzero, x="column", y="missing_count", title="Missing values by column"),
+                            use_container_width=True)
+        else:
+            st.success("No missing values found.")
+
+    st.subheader("Visualization")
+    chart_type = st.selectbox("Chart type", ["Bar", "Line", "Scatter", "Histogram", "Box", "Pie"], key="ooc_chart_type")
+    value_cols = numeric_cols if numeric_cols else columns
+
+    if chart_type == "Bar":
+        x_col = st.selectbox("X-axis", columns, key="ooc_x_axis")
+        y_col = st.selectbox("Y-axis", value_cols, key="ooc_y_axis")
+        color_col = st.selectbox("Color (optional)", ["None"] + columns, key="ooc_color_axis")
+        keys = [x_col] if color_col in ("None", x_col) else [x_col, color_col]
+        numeric = y_col in numeric_cols
+        total_name = y_col if y_col not in keys else f"{y_col} ({'sum' if numeric else 'count'})"
+        aggregate = (y_col, "hash_sum" if numeric else "hash_count", None, total_name)
+        agg = ooc_query(dataset, filter_expr, [aggregate], keys=keys).to_pandas()
+        fig = px.bar(agg, x=x_col, y=total_name, color=None if len(keys) == 1 else color_col, title="Bar chart")
+        show_figure(fig)
+
+    elif chart_type in ["Line", "Scatter"]:
+        x_col = st.selectbox("X-axis", columns, key="ooc_x_axis")
+        y_col = st.selectbox("Y-axis", value_cols, key="ooc_y_axis")
+        color_col = st.selectbox("Color (optional)", ["None"] + columns, key="ooc_color_axis")
+        plot_cols = list(dict.fromkeys([x_col, y_col] + ([] if color_col == "None" else [color_col])))
+        sample = ooc_sample(dataset, plot_cols, filtered_rows, filter_expr)
+        if len(sample) < filtered_rows:
+            st.caption(f"Showing {len(sample):,} evenly spaced rows of {filtered_rows:,}.")
+        plot = px.line if chart_type == "Line" else px.scatter
+        fig = plot(sample, x=x_col, y=y_col, color=None if color_col == "None" else color_col,
+                   title=f"{chart_type} chart")
+        show_figure(fig)
+
+    elif chart_type == "Histogram":
+        hist_col = st.selectbox("Column", numeric_cols, key="ooc_hist_col") if numeric_cols else None
+        bins = st.slider("Bins", 5, 100, 20, key="ooc_bins")
+        min_val, max_val = ooc_min_max(dataset, hist_col, filter_expr) if hist_col else (None, None)
+        if min_val is not None:
+            width = (max_val - min_val) / bins or 1.0
+            bucket = pc.min_element_wise(
+                pc.floor(pc.divide(pc.subtract(pc.field(hist_col).cast(pa.float64()), min_val), width)),
+                float(bins - 1),
+            )
+            counts = ooc_query(
+                dataset, filter_expr,
+                [("bucket", "hash_count", None, "count")],
+                keys=["bucket"],
+                projections={"bucket": bucket},
+            ).to_pandas().dropna().sort_values("bucket")
+            counts["bin_start"] = min_val + counts["bucket"] * width
+            fig = go.Figure(go.Bar(x=counts["bin_start"] + width / 2, y=counts["count"], width=width))
+            fig.update_layout(title="Histogram", xaxis_title=hist_col, yaxis_title="count", bargap=0)
+            show_figure(fig)
+        else:
+            st.info("No numeric values to plot.")
+
+    elif chart_type == "Box":
+        y_col = st.selectbox("Numeric column", numeric_cols, key="ooc_box_y") if numeric_cols else None
+        x_group = st.selectbox("Group by (optional)", ["None"] + columns, key="ooc_box_x")
+        if y_col is not None:
+            key_col = "__all__" if x_group == "None" else x_group
+            projections = {y_col: pc.field(y_col), key_col: pc.scalar("all") if x_group == "None" else pc.field(x_group)}
+            stats = ooc_query(
+                dataset, filter_expr,
+                [(y_col, "hash_tdigest", pc.TDigestOptions(q=[0, 0.25, 0.5, 0.75, 1]), "q")],
+                keys=[key_col],
+                projections=projections,
+            ).to_pylist()[:100]
+            fig = go.Figure()
+            for row in stats:
+                if row["q"]:
+                    q = row["q"]
+                    fig.add_trace(go.Box(name=str(row[key_col]), q1=[q[1]], median=[q[2]], q3=[q[3]],
+                                         lowerfence=[q[0]], upperfence=[q[4]]))
+            fig.update_layout(title="Box plot", yaxis_title=y_col)
+            show_figure(fig)
+        else:
+            st.info("No numeric columns found.")
+
+    elif chart_type == "Pie":
+        pie_col = st.selectbox("Category column", columns, key="ooc_pie_col")
+        pie_counts = ooc_top_values(dataset, pie_col, filter_expr)
+        pie_counts["value"] = pie_counts["value"].astype(str)
+        fig = px.pie(pie_counts, names="value", values="count", title="Pie chart")
+        show_figure(fig)
+
+    st.subheader("Export")
+    if st.button("Prepare filtered CSV", key="ooc_export"):
+        csv_buffer = io.BytesIO()
+        with pacsv.CSVWriter(csv_buffer, dataset.schema.empty_table().select(columns).schema) as writer:
+            for batch in dataset.to_batches(columns=columns, filter=filter_expr):
+                writer.write_batch(batch)
+        st.download_button(
+            label="Download filtered data as CSV",
+            data=csv_buffer.getvalue(),
+            file_name="filtered_data.csv",
+            mime="text/csv"
+        )
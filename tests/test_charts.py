@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from csv_explorer import lttb_indices, lttb_rows, stratified_sample_rows
+
+
+def line_frame(n_rows, n_groups, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "x": rng.permutation(n_rows).astype("float64"),
+        "y": np.cumsum(rng.normal(size=n_rows)),
+        "group": rng.integers(0, n_groups, n_rows).astype(str),
+        "label": rng.choice(["a", "b"], n_rows),
+    })
+
+
+@pytest.mark.parametrize("n_out", [3, 10, 500, 999])
+def test_lttb_indices_keep_endpoints_within_budget(n_out):
+    x = np.arange(1_000, dtype="float64")
+    y = np.sin(x / 25)
+    kept = lttb_indices(x, y, n_out)
+    assert len(kept) == n_out
+    assert kept[0] == 0 and kept[-1] == len(x) - 1
+    assert (np.diff(kept) > 0).all()
+
+
+def test_lttb_keeps_spike():
+    x = np.arange(1_000, dtype="float64")
+    y = np.zeros(1_000)
+    y[417] = 50.0
+    assert 417 in lttb_indices(x, y, 20)
+
+
+@pytest.mark.parametrize("n_groups", [1, 7, 40])
+@pytest.mark.parametrize("budget", [50, 300, 2_000])
+def test_lttb_rows_stay_within_point_budget(n_groups, budget):
+    df = line_frame(20_000, n_groups)
+    rows, _ = lttb_rows(df, "x", "y", "group" if n_groups > 1 else None, budget)
+    assert 0 < len(rows) <= budget
+    assert len(np.unique(rows)) == len(rows)
+    assert set(df["group"].iloc[rows]) == set(df["group"]) or 3 * n_groups > budget
+
+
+def test_lttb_rows_with_text_axes_stay_within_budget():
+    df = line_frame(5_000, 3)
+    rows, how = lttb_rows(df, "label", "y", None, 100)
+    assert len(rows) <= 100 and "LTTB" in how
+    rows, how = lttb_rows(df, "x", "label", None, 100)
+    assert len(rows) <= 100 and "evenly spaced" in how
+
+
+def test_stratified_sample_keeps_every_group():
+    df = line_frame(10_000, 30)
+    rows = stratified_sample_rows(df, "group", 60)
+    assert len(rows) <= 60
+    assert set(df["group"].iloc[rows]) == set(df["group"])
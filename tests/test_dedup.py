@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import csv_explorer
+from csv_explorer import (
+    SeenHashes, canonical_row_hashes, combined_columns, convert_datetime_columns, converted_row_fingerprints,
+    row_fingerprints, stream_dedup,
+)
+
+
+def random_parts(seed, n_parts=4, rows=300):
+    rng = np.random.default_rng(seed)
+    parts = []
+    for _ in range(n_parts):
+        part = pd.DataFrame({
+            "id": rng.integers(0, 60, rows),
+            "name": rng.choice(["ana", "ben", "chen", None], rows),
+            "score": rng.choice([1.5, 2.0, np.nan], rows),
+        })
+        parts.append(part)
+    return parts
+
+
+@pytest.mark.parametrize("spill_hashes", [7, 64, 10_000_000])
+def test_stream_dedup_matches_drop_duplicates(monkeypatch, spill_hashes):
+    monkeypatch.setattr(csv_explorer, "DEDUP_SPILL_HASHES", spill_hashes)
+    parts = random_parts(seed=spill_hashes)
+    expected = pd.concat(parts, ignore_index=True).drop_duplicates()
+
+    dfs = list(parts)
+    removed = stream_dedup(dfs, ["id", "name", "score"], [{}] * len(dfs))
+    kept = pd.concat(dfs, ignore_index=True)
+
+    assert sum(removed) == sum(len(part) for part in parts) - len(expected)
+    pd.testing.assert_frame_equal(kept, expected.reset_index(drop=True))
+
+
+def test_stream_dedup_seeded_with_earlier_parts(monkeypatch):
+    monkeypatch.setattr(csv_explorer, "DEDUP_SPILL_HASHES", 16)
+    first, second, third = random_parts(seed=1, n_parts=3)
+    dfs = [first, second]
+    stream_dedup(dfs, ["id", "name", "score"], [{}, {}])
+
+    appended = [third]
+    stream_dedup(appended, ["id", "name", "score"], [{}], seen_parts=[(df, {}) for df in dfs])
+    expected = pd.concat([first, second, third], ignore_index=True).drop_duplicates()
+    pd.testing.assert_frame_equal(pd.concat(dfs + appended, ignore_index=True), expected.reset_index(drop=True))
+
+
+def test_constants_keep_rows_from_different_sources_apart():
+    part = pd.DataFrame({"value": [1, 2]})
+    dfs = [part, part.copy()]
+    removed = stream_dedup(dfs, ["value", "source_file"], [{"source_file": "a.csv"}, {"source_file": "b.csv"}])
+    assert removed == [0, 0]
+
+
+def test_canonical_hashes_agree_across_dtypes():
+    ints = pd.DataFrame({"x": pd.array([1, 2, None], dtype="Int64"), "y": ["a", "b", None]})
+    floats = pd.DataFrame({"x": [1.0, 2.0, np.nan], "y": pd.Categorical(["a", "b", None])})
+    missing = pd.DataFrame({"x": [1.0, 2.0, np.nan]})
+    np.testing.assert_array_equal(canonical_row_hashes(ints, ["x", "y"]), canonical_row_hashes(floats, ["x", "y"]))
+    assert canonical_row_hashes(missing, ["x", "y"])[2] == canonical_row_hashes(ints, ["x", "y"])[2]
+
+
+def test_seen_hashes_across_spilled_runs(tmp_path):
+    seen = SeenHashes(max_in_memory=5, spill_dir=str(tmp_path))
+    batches = [np.arange(start, start + 4, dtype=np.uint64) * np.uint64(7) for start in range(0, 40, 4)]
+    for batch in batches:
+        seen.add(batch)
+    assert seen.runs
+    added = np.concatenate(batches)
+    assert seen.contains(added).all()
+    assert not seen.contains(added + np.uint64(1)).any()
+    seen.runs.clear()
+
+
+def test_combined_columns():
+    lists = [["a", "b", "c"], ["c", "d", "a"]]
+    assert combined_columns(lists, "outer") == ["a", "b", "c", "d"]
+    assert combined_columns(lists, "inner") == ["a", "c"]
+
+
+def test_fingerprints_follow_datetime_conversion():
+    df = pd.DataFrame({
+        "when": pd.array(["2020-01-01", "2020-01-01 00:00:00", "later"], dtype="string[pyarrow]"),
+        "source_file": ["a.csv", "b.csv", "a.csv"],
+    })
+    assert not row_fingerprints(df)["all_columns"].duplicated().any()
+    converted, _ = convert_datetime_columns(df, {"when": None}, "fingerprints-test")
+    hashes = converted_row_fingerprints(converted, "fingerprints-test|when", ignore_columns=("source_file",))
+    assert hashes["data_columns"].duplicated().sum() == 1
+    assert not hashes["all_columns"].duplicated().any()
@@ -0,0 +1,44 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import csv_explorer
+from csv_explorer import CsvSource, convert_csv_to_parquet, ooc_sample
+
+
+def test_late_conflicts_are_widened_in_one_validation_pass(monkeypatch, tmp_path):
+    monkeypatch.setattr(csv_explorer, "OUT_OF_CORE_DIR", tmp_path)
+    # Past the first 16 MiB block, two columns stop fitting their inferred types.
+    data = b"a,b,c,d\n" + b"1,2,0.5,abc\n" * 1_500_000 + b"1.5,x,0.25,def\n"
+    source = CsvSource(data, "late.csv", "late", len(data))
+    opened = []
+    open_stream = source.open
+    monkeypatch.setattr(source, "open", lambda: opened.append(1) or open_stream())
+
+    path = convert_csv_to_parquet(source, tmp_path / "late.parquet", "utf8")
+    schema = pq.read_schema(path)
+    assert [schema.field(name).type for name in "abcd"] == [pa.float64(), pa.string(), pa.float64(), pa.string()]
+    assert pq.read_metadata(path).num_rows == 1_500_001
+    # First attempt, the validation pass, and the final write.
+    assert len(opened) == 3
+
+
+def test_out_of_core_sample_spans_the_filtered_rows(tmp_path):
+    n_rows = 200_000
+    table = pa.table({"i": np.arange(n_rows), "even": np.arange(n_rows) % 2 == 0})
+    pq.write_table(table, tmp_path / "rows.parquet", row_group_size=10_000)
+    dataset = ds.dataset(tmp_path / "rows.parquet")
+
+    sample = ooc_sample(dataset, ["i"], n_rows, limit=1_000)
+    assert len(sample) == 1_000
+    assert sample["i"].min() == 0 and sample["i"].max() == n_rows - 1
+
+    even = pc.field("even")
+    sample = ooc_sample(dataset, ["i"], n_rows // 2, even, limit=1_000)
+    assert len(sample) == 1_000
+    assert (sample["i"].to_numpy() % 2 == 0).all()
+    assert sample["i"].max() == n_rows - 2
+
+    assert len(ooc_sample(dataset, ["i"], n_rows, limit=n_rows)) == n_rows
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import csv_explorer
+from csv_explorer import (
+    compact_dtypes, correlation_matrix, correlation_pairs, hash_values, hll_estimate, hll_merge, hll_precision, hll_sketch,
+    top_k_values,
+)
+
+
+@pytest.mark.parametrize("n_distinct", [10, 5_000, 200_000])
+def test_hll_estimate_within_error(n_distinct):
+    precision = hll_precision(0.01)
+    values = pd.Series(np.arange(n_distinct) % n_distinct).sample(frac=1.0, random_state=0)
+    estimate = hll_estimate(hll_sketch(hash_values(values), precision))
+    assert abs(estimate - n_distinct) <= max(2, 0.05 * n_distinct)
+
+
+def test_hll_merge_equals_sketch_of_union():
+    precision = 12
+    left = pd.Series(np.arange(0, 60_000))
+    right = pd.Series(np.arange(40_000, 100_000))
+    merged = hll_merge([hll_sketch(hash_values(left), precision), hll_sketch(hash_values(right), precision)])
+    union = hll_sketch(hash_values(pd.concat([left, right]).drop_duplicates()), precision)
+    np.testing.assert_array_equal(merged, union)
+
+
+def test_top_k_summary_matches_value_counts(monkeypatch):
+    monkeypatch.setattr(csv_explorer, "TOP_K_EXACT_ROWS", 1_000)
+    monkeypatch.setattr(csv_explorer, "TOP_K_CHUNK_ROWS", 997)
+    rng = np.random.default_rng(0)
+    series = pd.Series(rng.zipf(1.3, 50_000) % 5_000).astype(str)
+    expected = series.value_counts().head(10)
+    top = top_k_values(series, 10)
+    assert top["value"].tolist() == expected.index.tolist()
+    assert top["count"].tolist() == expected.tolist()
+
+
+def test_top_k_counts_missing_values(monkeypatch):
+    monkeypatch.setattr(csv_explorer, "TOP_K_EXACT_ROWS", 10)
+    series = pd.Series(["a"] * 30 + [None] * 20 + ["b"] * 5)
+    top = top_k_values(series, 2, dropna=False)
+    assert top["count"].tolist() == [30, 20]
+    assert pd.isna(top["value"].iloc[1])
+
+
+def test_blocked_correlation_matches_pandas(monkeypatch):
+    monkeypatch.setattr(csv_explorer, "CORR_BLOCK_ROWS", 97)
+    rng = np.random.default_rng(0)
+    base = rng.normal(size=1_000)
+    df = pd.DataFrame({
+        "a": base * 1e6 + 1e9,
+        "b": base + rng.normal(scale=0.5, size=1_000),
+        "c": rng.normal(size=1_000),
+        "constant": np.ones(1_000),
+    })
+    df.loc[rng.choice(1_000, 150, replace=False), "b"] = np.nan
+    df.loc[rng.choice(1_000, 80, replace=False), "c"] = np.nan
+    corr, counts = correlation_matrix(df, "test", tuple(df.columns))
+    pd.testing.assert_frame_equal(corr, df.corr(), atol=1e-9)
+    assert counts.loc["a", "b"] == df[["a", "b"]].dropna().shape[0]
+
+    pairs = correlation_pairs(corr, counts, 2)
+    assert pairs[["column_a", "column_b"]].values.tolist()[0] == ["a", "b"]
+    assert (pairs["ci_low"] <= pairs["correlation"]).all() and (pairs["correlation"] <= pairs["ci_high"]).all()
+
+
+def test_compact_dtypes_keeps_mostly_distinct_text_as_strings():
+    n_rows = 10_000
+    df = pd.DataFrame({
+        "status": np.resize(["open", "closed", "pending"], n_rows),
+        "code": [f"c{i % 2_000}" for i in range(n_rows)],
+    })
+    compacted, memory_report = compact_dtypes(df)
+    assert isinstance(compacted["status"].dtype, pd.CategoricalDtype)
+    assert isinstance(compacted["code"].dtype, pd.ArrowDtype)
+    assert compacted["code"].tolist() == df["code"].tolist()
+    assert (memory_report["memory_mb_after"] <= memory_report["memory_mb_before"]).all()
@@ -0,0 +1,51 @@
+import pandas as pd
+
+from csv_explorer import DatasetRegistry
+
+
+def frame():
+    return pd.DataFrame({"x": [1, 2, 3]})
+
+
+def test_dataset_is_evicted_when_its_last_session_moves_on():
+    registry = DatasetRegistry(idle_seconds=3_600)
+    assert registry.acquire("first", "session") is None
+    registry.put("first", frame(), name="first")
+    assert registry.current("session")["name"] == "first"
+
+    assert registry.acquire("second", "session") is None
+    assert "first" not in registry.datasets
+    assert registry.current("session") is None
+
+
+def test_dataset_shared_with_another_session_stays_resident():
+    registry = DatasetRegistry(idle_seconds=3_600)
+    registry.acquire("shared", "one")
+    registry.put("shared", frame(), name="shared")
+    assert registry.acquire("shared", "two")["name"] == "shared"
+
+    registry.acquire("other", "one")
+    assert "shared" in registry.datasets
+    registry.acquire("other", "two")
+    assert "shared" not in registry.datasets
+
+
+def test_rerun_on_the_same_key_keeps_the_dataset():
+    registry = DatasetRegistry(idle_seconds=3_600)
+    registry.acquire("key", "session")
+    registry.put("key", frame(), name="key")
+    assert registry.acquire("key", "session")["name"] == "key"
+
+
+def test_unreferenced_dataset_lapses_after_idle_seconds(monkeypatch):
+    registry = DatasetRegistry(idle_seconds=10)
+    clock = [1_000.0]
+    monkeypatch.setattr("csv_explorer.time.time", lambda: clock[0])
+    registry.acquire("old", "abandoned")
+    registry.put("old", frame(), name="old")
+    clock[0] += 5
+    registry.acquire("new", "other")
+    assert "old" in registry.datasets
+    clock[0] += 6
+    registry.acquire("new", "other")
+    assert "old" not in registry.datasets
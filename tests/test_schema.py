@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+from csv_explorer import CsvSource, apply_schema_plan, plan_combined_schema, sampled_kind, unified_arrow_type
+
+
+def source(text, name):
+    data = text.encode()
+    return CsvSource(data, name, name, len(data))
+
+
+@pytest.mark.parametrize("kinds, expected", [
+    (["int", "int"], "int64"),
+    (["int", "float", "null"], "double"),
+    (["bool", "bool"], "bool"),
+    (["bool", "int"], "string"),
+    (["int", "string"], "string"),
+    (["int", "other"], None),
+    (["null"], None),
+])
+def test_unified_arrow_type(kinds, expected):
+    assert unified_arrow_type(kinds) == expected
+
+
+def test_sampled_kind():
+    assert sampled_kind(pd.Series([None, None], dtype="object")) == "null"
+    assert sampled_kind(pd.Series([1, 2])) == "int"
+    assert sampled_kind(pd.Series(["a"])) == "string"
+    assert sampled_kind(pd.Series(pd.to_datetime(["2020-01-01"]))) == "other"
+
+
+def test_plan_unifies_dtypes_across_files():
+    sources = [source("id,score,name\n1,2,a\n2,3,b\n", "a.csv"), source("id,score\n3,4.5\n4,x\n", "b.csv")]
+    plans, schema = plan_combined_schema(sources, ("a", "b"), "Auto try common encodings", "Auto detect", "Append rows (keep all columns)")
+    assert schema.set_index("column")["planned_dtype"].to_dict() == {"id": "int64", "score": "string", "name": "string"}
+    assert plans[0]["dtype"] == {"id": "int64", "score": "string", "name": "string"}
+    assert plans[1]["usecols"] is None
+
+
+def test_plan_projects_shared_columns_for_inner_join():
+    sources = [source("id,score,name\n1,2,a\n", "a.csv"), source("id,name\n3,c\n", "b.csv")]
+    plans, schema = plan_combined_schema(sources, ("a2", "b2"), "Auto try common encodings", "Auto detect", "Append rows (shared columns only)")
+    assert schema["column"].tolist() == ["id", "name"]
+    assert plans[0]["usecols"] == ["id", "name"]
+    assert plans[1]["usecols"] is None
+
+
+def test_apply_schema_plan_casts_a_parsed_block():
+    block = pd.DataFrame({
+        "id": pd.array([1, 2], dtype="int64[pyarrow]"),
+        "score": pd.array([2.5, 3.0], dtype="double[pyarrow]"),
+        "extra": pd.array(["x", "y"], dtype="string[pyarrow]"),
+    })
+    planned, held = apply_schema_plan(block, {"usecols": ["id", "score"], "dtype": {"id": "double", "score": "string"}})
+    assert held
+    assert planned.columns.tolist() == ["id", "score"]
+    assert planned.dtypes.astype(str).tolist() == ["double[pyarrow]", "string[pyarrow]"]
+    assert block["id"].dtype == "int64[pyarrow]"
+
+
+def test_apply_schema_plan_keeps_parsed_dtype_when_values_do_not_fit():
+    block = pd.DataFrame({"id": pd.array([1.5, 2.0], dtype="double[pyarrow]")})
+    planned, held = apply_schema_plan(block, {"usecols": None, "dtype": {"id": "int64"}})
+    assert not held
+    assert planned["id"].dtype == "double[pyarrow]"
@@ -0,0 +1,99 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from csv_explorer import (
+    TrigramIndex, arrow_search_mask, refine_search_mask, regex_stays_in_cell, required_literals, scan_search_mask
+)
+
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(0)
+    n_rows = 2_000
+    df = pd.DataFrame({
+        "name": rng.choice(["Alpha Beta", "gamma", "ALPHABET", "delta|pipe", None], n_rows),
+        "city": pd.Categorical(rng.choice(["Cairo", "Oslo", "Lima", None], n_rows)),
+        "count": rng.integers(0, 3_000, n_rows),
+        "price": rng.choice([1.5, 20.25, 2020.0, np.nan], n_rows),
+        "when": pd.to_datetime("2020-01-01") + pd.to_timedelta(rng.integers(0, 900, n_rows), unit="D"),
+        "flag": rng.choice([True, False], n_rows),
+    })
+    df["note"] = pd.array(rng.choice(["first run", "Second Run", "", None], n_rows), dtype="string[pyarrow]")
+    return df
+
+
+PLAIN_QUERIES = ["alpha", "Alpha", "pha", "Cairo", "lim", "202", "2020", "1.5", "2021-03", "Run", "run",
+                 "true", "false", "True", "nomatch", "a b", "ALPHABET", "pipe"]
+REGEX_QUERIES = ["al[p]ha", "a{2}", "[0-9]{4}", "Ca(?:iro|sa)", "r?un", "lim", "C[a-z]+o"]
+SPANNING_REGEXES = ["alp.*2020", "^Alpha", "Beta$", "gamma \\| Oslo", "a\\s+B", "\\bOslo\\b", "[^x]{3}",
+                    "x*", "pipe|", "[a-z ]{7}", "(?i)oslo", "(?=Oslo)Oslo", "(a)\\1"]
+
+
+@pytest.mark.parametrize("case_sensitive", [False, True])
+@pytest.mark.parametrize("query", PLAIN_QUERIES)
+def test_plain_search_engines_agree(frame, query, case_sensitive):
+    expected = scan_search_mask(frame, query, case_sensitive, False)
+    np.testing.assert_array_equal(arrow_search_mask(frame, query, case_sensitive, False)[0], expected)
+    np.testing.assert_array_equal(TrigramIndex(frame).search(frame, query, case_sensitive, False)[0], expected)
+
+
+@pytest.mark.parametrize("case_sensitive", [False, True])
+@pytest.mark.parametrize("query", REGEX_QUERIES)
+def test_regex_search_engines_agree(frame, query, case_sensitive):
+    expected = scan_search_mask(frame, query, case_sensitive, True)
+    np.testing.assert_array_equal(arrow_search_mask(frame, query, case_sensitive, True)[0], expected)
+    indexed = TrigramIndex(frame).search(frame, query, case_sensitive, True)
+    if indexed is not None:
+        np.testing.assert_array_equal(indexed[0], expected)
+
+
+@pytest.mark.parametrize("case_sensitive", [False, True])
+@pytest.mark.parametrize("query", SPANNING_REGEXES)
+def test_regex_that_may_span_cells_falls_back_to_the_scan(frame, query, case_sensitive):
+    assert arrow_search_mask(frame, query, case_sensitive, True) is None
+    expected = scan_search_mask(frame, query, case_sensitive, True)
+    np.testing.assert_array_equal(refine_search_mask(frame, np.arange(len(frame)), query, case_sensitive, True,
+                                                     "Column-wise (Arrow)"), expected)
+    indexed = TrigramIndex(frame).search(frame, query, case_sensitive, True)
+    if indexed is not None:
+        np.testing.assert_array_equal(indexed[0], expected)
+
+
+def test_spanning_regex_differs_between_cells_and_rows(frame):
+    assert scan_search_mask(frame, "alp.*2020", False, True).any()
+
+
+@pytest.mark.parametrize("pattern, stays", [
+    ("alpha", True), ("a[b-d]+", True), ("x{2,3}?", True), ("(?P<city>Cairo|Lima)", True), ("\\.5", True),
+    ("a.b", False), ("^a", False), ("a$", False), ("a\\ b", False), ("a\\|b", False), ("[!-~]", False),
+    ("[^a]", False), ("\\d+", False), ("a{,2}b", False), ("a++", False), ("[[:alpha:]]", False), ("a?", False),
+])
+def test_regex_stays_in_cell(pattern, stays):
+    assert regex_stays_in_cell(pattern) is stays
+
+
+@pytest.mark.parametrize("query", ["a | b", "|", " gamma", "x|y"])
+def test_queries_that_may_straddle_cells_fall_back_to_the_scan(frame, query):
+    assert arrow_search_mask(frame, query, False, False) is None
+    assert TrigramIndex(frame).search(frame, query, False, False) is None
+
+
+def test_required_literals():
+    assert required_literals("Ca(?:iro|sa)") == []
+    assert required_literals("alpha[0-9]+beta") == ["alpha", "beta"]
+
+
+def test_regex_falls_back_when_the_private_parser_is_unavailable(frame, monkeypatch):
+    monkeypatch.delattr(re, "_parser")
+    assert required_literals("alpha") is None
+    assert TrigramIndex(frame).search(frame, "alpha", False, True) is None
+
+
+@pytest.mark.parametrize("engine", ["Column-wise (Arrow)", "Full scan"])
+def test_refined_search_matches_full_search(frame, engine):
+    rows = np.flatnonzero(scan_search_mask(frame, "alpha", False, False))
+    refined = refine_search_mask(frame, rows, "alphab", False, False, engine)
+    np.testing.assert_array_equal(refined, scan_search_mask(frame, "alphab", False, False))
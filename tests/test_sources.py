@@ -0,0 +1,63 @@
+import io
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import csv_explorer
+from csv_explorer import inflated_size, upload_sources
+
+
+class Upload(io.BytesIO):
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+        self.file_id = name
+
+
+def csv_bytes(n_rows):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"id": np.arange(n_rows), "value": rng.normal(size=n_rows), "tag": rng.choice(["a", "b"], n_rows)})
+    return df.to_csv(index=False).encode()
+
+
+def compress(data, codec):
+    sink = pa.BufferOutputStream()
+    with pa.CompressedOutputStream(sink, codec) as stream:
+        stream.write(data)
+    return sink.getvalue().to_pybytes()
+
+
+@pytest.mark.parametrize("codec", ["gzip", "bz2", "zstd"])
+def test_small_compressed_upload_has_exact_inflated_size(codec):
+    data = csv_bytes(1_000)
+    assert inflated_size(compress(data, codec), f"small-{codec}", codec) == (len(data), False)
+
+
+@pytest.mark.parametrize("codec", ["gzip", "bz2", "zstd"])
+def test_large_compressed_upload_size_is_estimated(monkeypatch, codec):
+    monkeypatch.setattr(csv_explorer, "SIZE_PROBE_BYTES", 1 << 20)
+    data = csv_bytes(300_000)
+    size, estimated = inflated_size(compress(data, codec), f"large-{codec}", codec)
+    assert estimated
+    assert 0.5 * len(data) < size < 1.5 * len(data)
+
+
+def test_upload_sizes_are_inflated_with_compressed_size_kept_apart():
+    data = csv_bytes(2_000)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("one.csv", data)
+    (member,) = upload_sources(Upload(archive.getvalue(), "bundle.zip"))
+    assert member.size == len(data)
+    assert member.compressed_size < len(data)
+
+    packed = compress(data, "gzip")
+    (source,) = upload_sources(Upload(packed, "one.csv.gz"))
+    assert (source.size, source.compressed_size, source.size_estimated) == (len(data), len(packed), False)
+
+    (plain,) = upload_sources(Upload(data, "one.csv"))
+    assert (plain.size, plain.compressed_size) == (len(data), None)